@@ -1,11 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import os, uuid
+import os, uuid, json, time, logging
 
-from ocr_llm_extractor import extract_document_info
+from ocr_llm_extractor import extract_document_info, pipeline_config, OCR_LANG, OCR_CONFIG
+from jobs import get_job_queue, run_extraction, QueueFullError
+from result_cache import get_result_cache, cache_key
+from pages import is_multipage, process_pages, merge_page_results
+from date_normalizer import date_cache_stats
+from templates import extract_scientific_fields
+import ocr_backends
+import metrics
 
+# Les uploads sont traités en mémoire ; les conserver sur disque est une
+# option d'audit (ADMINDOC_SAVE_UPLOADS=1)
 UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+SAVE_UPLOADS = os.environ.get("ADMINDOC_SAVE_UPLOADS", "0") == "1"
+if SAVE_UPLOADS:
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# NER LayoutLMv3 en complément des règles (micro-batché entre requêtes)
+NER_ENABLED = os.environ.get("ADMINDOC_NER", "0") == "1"
+# Charger le modèle au démarrage plutôt qu'à la première requête
+NER_WARMUP = os.environ.get("ADMINDOC_NER_WARMUP", "1") == "1"
 
 app = Flask(__name__)
 CORS(app)
@@ -21,100 +37,248 @@ def process_document():
     if file.filename == "":
         return jsonify({"error": "Empty file"}), 400
 
-    # Save file
     file_id = str(uuid.uuid4())[:8]
-    img_path = os.path.join(UPLOAD_FOLDER, f"{file_id}.png")
-    file.save(img_path)
+    data = file.read()
+    # audit de chaque upload, y compris ceux servis depuis le cache
+    audit_upload(data, file_id, file.filename)
+
+    # Document déjà traité avec la même configuration ? (les PDF/TIFF
+    # passent par les workers de jobs, sans NER)
+    multipage = is_multipage(data)
+    key = cache_key(data, request_config(ner=False) if multipage else request_config())
+    cached = get_result_cache().get(key)
+    if cached is not None:
+        return jsonify(build_response(cached, file_id, cache_hit=True)), 200
+
+    if multipage:
+        # PDF / TIFF : pages traitées en parallèle puis fusionnées
+        try:
+            page_results = [result for _, result in
+                            process_pages(data, get_job_queue(), file_id=file_id)]
+            extracted_data = merge_page_results(page_results)
+            metrics.observe_result(extracted_data, route="process")
+            if "error" not in extracted_data:
+                get_result_cache().put(key, extracted_data)
+            return jsonify(build_response(extracted_data, file_id)), 200
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
 
     try:
         # extract_document_info retourne déjà un JSON complet
-        extracted_data = extract_document_info(img_path)
-        
-        # Extraire directement les données utiles
-        document_type = extracted_data.get("document_type", "unknown")
-        confidence = extracted_data.get("confidence", 0.0)
-        fields = extracted_data.get("fields", {})
-        
-        # Ajouter les champs spécifiques attendus
-        enhanced_fields = {
-            "registration_number": fields.get("reference_number") or fields.get("registration_number"),
-            "date": fields.get("date"),
-            "authors": fields.get("persons") or fields.get("authors"),
-            "title": fields.get("title"),
-            "recommendation": fields.get("recommendation"),
-            "suggested_revision": fields.get("suggested_revision")
-        }
-        
-        # Pour ce document scientifique spécifique, analyser le texte OCR
-        if "REVIEW" in extracted_data.get("raw_ocr_preview", ""):
-            document_type = "scientific_review_form"
-            confidence = 0.99
-            
-            # Analyser le texte OCR pour extraire les champs spécifiques
-            raw_text = extracted_data.get("raw_ocr_preview", "")
-            enhanced_fields.update(extract_scientific_fields(raw_text))
-
-        response = {
-            "document_type": document_type,
-            "confidence": confidence,
-            "fields": enhanced_fields,
-            "metadata": {
-                "file_id": file_id,
-                "processing_time": extracted_data.get("metadata", {}).get("processing_time", ""),
-                "extraction_method": extracted_data.get("extraction_method", "ocr_rules_based")
-            }
-        }
-
-        return jsonify(response), 200
+        extracted_data = extract_document_info(data, return_layout=NER_ENABLED)
+        if NER_ENABLED:
+            # Le NER réutilise les mots/boîtes de l'OCR (un seul passage
+            # Tesseract) ; le forward est partagé avec les requêtes concurrentes
+            from model import get_batcher
+            layout = extracted_data.pop("layout", None)
+            ner_input = {"image": data, **layout} if layout else data
+            start = time.perf_counter()
+            extracted_data["ner_entities"] = get_batcher().submit(ner_input).result()
+            # attente du lot comprise : latence vue par la requête
+            extracted_data["metadata"].setdefault("timings_ms", {})["ner"] = round(
+                (time.perf_counter() - start) * 1000, 2)
+        metrics.observe_result(extracted_data, route="process")
+        if "error" not in extracted_data:
+            get_result_cache().put(key, extracted_data)
+        return jsonify(build_response(extracted_data, file_id)), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-def extract_scientific_fields(text):
-    """Extraction spécifique pour les formulaires scientifiques"""
-    fields = {
-        "registration_number": None,
-        "date": None,
-        "authors": None,
-        "title": None,
-        "recommendation": None,
-        "suggested_revision": None
-    }
-    
-    import re
-    
-    # Registration Number
-    reg_match = re.search(r'Registration No\.\s*(\S+)', text, re.IGNORECASE)
-    if reg_match:
-        fields["registration_number"] = reg_match.group(1)
-    
-    # Date
-    date_match = re.search(r'Date\s+([A-Za-z]+\s+\d{1,2},\s+\d{4})', text, re.IGNORECASE)
-    if date_match:
-        fields["date"] = date_match.group(1)
-    
-    # Authors
-    authors_match = re.search(r'AUTHORS?:\s*(.+?)(?=\nTITLE|\nREVIEW|\n\n)', text, re.IGNORECASE | re.DOTALL)
-    if authors_match:
-        fields["authors"] = authors_match.group(1).strip()
-    
-    # Title
-    title_match = re.search(r'TITLE\s*["\']?(.+?)["\']?(?=\nREVIEW|\n\n)', text, re.IGNORECASE | re.DOTALL)
-    if title_match:
-        fields["title"] = title_match.group(1).strip()
-    
-    # Recommendation
-    rec_match = re.search(r'RECOMMENDATION[:_]\s*(.+?)(?=\n|$)', text, re.IGNORECASE)
-    if rec_match:
-        fields["recommendation"] = rec_match.group(1).strip()
+@app.post("/process/pages")
+def process_pages_stream():
+    """Résultats page par page au fil de l'eau (NDJSON, ou SSE avec ?format=sse),
+    puis le résultat fusionné du document"""
+
+    if "file" not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files["file"]
+    if file.filename == "":
+        return jsonify({"error": "Empty file"}), 400
+
+    file_id = str(uuid.uuid4())[:8]
+    data = file.read()
+    audit_upload(data, file_id, file.filename)
+
+    sse = request.args.get("format") == "sse"
+
+    def encode(message):
+        line = json.dumps(message, ensure_ascii=False)
+        return f"data: {line}\n\n" if sse else line + "\n"
+
+    def generate():
+        page_results = []
+        try:
+            for page_num, result in process_pages(data, get_job_queue(), file_id=file_id):
+                page_results.append(result)
+                yield encode({"page": page_num, "result": build_response(result, file_id)})
+        except Exception as e:
+            yield encode({"error": str(e)})
+            return
+
+        merged = merge_page_results(page_results)
+        metrics.observe_result(merged, route="process_pages")
+        yield encode({
+            "document": build_response(merged, file_id),
+            "pages": merged["metadata"]["pages"],
+        })
+
+    mimetype = "text/event-stream" if sse else "application/x-ndjson"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+@app.post("/jobs")
+def submit_job():
+    """Mode asynchrone : renvoie immédiatement un id de job"""
+
+    if "file" not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files["file"]
+    if file.filename == "":
+        return jsonify({"error": "Empty file"}), 400
+
+    file_id = str(uuid.uuid4())[:8]
+    data = file.read()
+    audit_upload(data, file_id, file.filename)
+
+    # Les jobs n'exécutent que les règles (pas de modèle dans les workers)
+    key = cache_key(data, request_config(ner=False))
+    cached = get_result_cache().get(key)
+    if cached is not None:
+        # Pas besoin de job : le résultat est déjà connu
+        return jsonify({
+            "job_id": None,
+            "file_id": file_id,
+            "status": "done",
+            "timings": {},
+            "result": build_response(cached, file_id, cache_hit=True),
+        }), 200
+
+    def store_result(job):
+        metrics.observe_result(job.result, route="jobs")
+        if "error" not in job.result:
+            get_result_cache().put(key, job.result)
+
+    try:
+        job = get_job_queue().submit(run_extraction, data,
+                                     file_id=file_id, callback=store_result)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+
+    return jsonify(job.to_dict()), 202, {"Location": f"/jobs/{job.id}"}
+
+
+@app.get("/jobs/<job_id>")
+def get_job(job_id):
+    """Statut du job ; ?wait=<secondes> pour un long-poll"""
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return jsonify({"error": "Invalid wait parameter"}), 400
+
+    job = get_job_queue().wait(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    info = job.to_dict()
+    if info["status"] == "done":
+        info["result"] = build_response(job.result, job.file_id)
+    return jsonify(info), 200
+
+
+@app.get("/jobs")
+def jobs_stats():
+    return jsonify(get_job_queue().stats())
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    stats = get_result_cache().stats()
+    # cache des dates du processus API (chaque worker de /jobs a le sien)
+    stats["dates"] = date_cache_stats()
+    return jsonify(stats)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Durées par étape et documents traités, format texte Prometheus"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def request_config(ner=NER_ENABLED):
+    """Configuration de la requête (clé du cache des résultats)"""
+    config = dict(pipeline_config(), ner=ner)
+    if ner:
+        import model
+        config["ner_model"] = [model.MODEL_PATH, model.INFERENCE_BACKEND]
+    return config
+
+
+def audit_upload(data, file_id, filename):
+    """Conserver une copie de l'upload si l'audit est activé"""
+    if not SAVE_UPLOADS:
+        return None
+    ext = os.path.splitext(filename or "")[1].lower() or ".bin"
+    path = os.path.join(UPLOAD_FOLDER, f"{file_id}{ext}")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def build_response(extracted_data, file_id, cache_hit=False):
+    """Mettre en forme la sortie de extract_document_info pour l'API"""
+    # Extraire directement les données utiles
+    document_type = extracted_data.get("document_type", "unknown")
+    confidence = extracted_data.get("confidence", 0.0)
+    fields = extracted_data.get("fields", {})
     
-    # Suggested Revision
-    rev_match = re.search(r'SUGGESTED REVISIONS?[:_]\s*(.+?)(?=\n\n|$)', text, re.IGNORECASE | re.DOTALL)
-    if rev_match:
-        fields["suggested_revision"] = rev_match.group(1).strip()
+    # Ajouter les champs spécifiques attendus
+    enhanced_fields = {
+        "registration_number": fields.get("reference_number") or fields.get("registration_number"),
+        "date": fields.get("date"),
+        "authors": fields.get("persons") or fields.get("authors"),
+        "title": fields.get("title"),
+        "recommendation": fields.get("recommendation"),
+        "suggested_revision": fields.get("suggested_revision")
+    }
     
-    return fields
+    # Pour ce document scientifique spécifique, analyser le texte OCR
+    if "REVIEW" in extracted_data.get("raw_ocr_preview", ""):
+        document_type = "scientific_review_form"
+        confidence = 0.99
+        
+        # Analyser le texte OCR pour extraire les champs spécifiques
+        raw_text = extracted_data.get("raw_ocr_preview", "")
+        enhanced_fields.update(extract_scientific_fields(raw_text))
+
+    response = {
+        "document_type": document_type,
+        "confidence": confidence,
+        "fields": enhanced_fields,
+        "metadata": {
+            "file_id": file_id,
+            "processed_at": extracted_data.get("metadata", {}).get("processed_at", ""),
+            "processing_time_ms": extracted_data.get("metadata", {}).get("processing_time_ms"),
+            "timings_ms": extracted_data.get("metadata", {}).get("timings_ms", {}),
+            "extraction_method": extracted_data.get("extraction_method", "ocr_rules_based"),
+            "cache_hit": cache_hit
+        }
+    }
+
+    # clés présentes selon le chemin suivi (multi-pages, classification, modèle)
+    for key in ("pages", "classification", "template"):
+        if key in extracted_data.get("metadata", {}):
+            response["metadata"][key] = extracted_data["metadata"][key]
+
+    if "ner_entities" in extracted_data:
+        response["ner_entities"] = extracted_data["ner_entities"]
+
+    return response
 
 
 @app.get("/")
@@ -122,5 +286,27 @@ def index():
     return jsonify({"status": "OCR + LLM API OK"})
 
 
+def warmup_models():
+    if NER_ENABLED and NER_WARMUP:
+        import model
+        model.warmup()
+    if ocr_backends.OCR_BACKEND == "tesserocr":
+        # charger les traineddata avant la première requête synchrone
+        ocr_backends.get_backend().warmup(OCR_LANG, OCR_CONFIG)
+
+
+# Préchauffage au chargement de l'application, quel que soit le serveur
+# (gunicorn, waitress, `flask run`) : chaque processus qui importe `api:app`
+# sert des requêtes. Exclus : `python api.py` (voir plus bas) et sa
+# réimportation en `__mp_main__` par les workers des pools en mode spawn.
+if __name__ not in ("__main__", "__mp_main__"):
+    warmup_models()
+
+
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("ADMINDOC_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Avec le reloader, seul le processus enfant sert les requêtes
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup_models()
     app.run(port=5000, debug=True)
\ No newline at end of file
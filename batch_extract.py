@@ -0,0 +1,298 @@
+# batch_extract.py
+# Extraction en masse hors API : répertoires, motifs glob ou manifestes
+# traités par N processus. Les résultats sont écrits en JSONL au fil de
+# l'eau ; ce fichier sert aussi de point de reprise après interruption.
+#
+#   python batch_extract.py archives/ --output results.jsonl --workers 8 [--ner]
+import os
+import sys
+import glob
+import json
+import time
+import signal
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+
+from ocr_llm_extractor import extract_document_info
+from pages import is_multipage, iter_pages, merge_page_results
+
+DOCUMENT_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".pdf")
+MANIFEST_EXTENSIONS = (".txt", ".jsonl")
+
+
+# ============================================================
+# ENTRÉES
+# ============================================================
+
+def _from_manifest(path):
+    """Un chemin par ligne (.txt) ou un objet avec "image_path" par ligne (.jsonl)"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.lower().endswith(".jsonl"):
+                line = json.loads(line)["image_path"]
+            # chemins écrits sous Windows (train_data.jsonl)
+            yield os.path.normpath(line.replace("\\", "/"))
+
+
+def list_documents(inputs, recursive=False):
+    """Documents à traiter, sans doublons, dans l'ordre des arguments"""
+    seen = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*") if recursive else os.path.join(item, "*")
+            paths = sorted(p for p in glob.glob(pattern, recursive=recursive)
+                           if p.lower().endswith(DOCUMENT_EXTENSIONS))
+        elif os.path.isfile(item) and item.lower().endswith(MANIFEST_EXTENSIONS):
+            paths = _from_manifest(item)
+        else:
+            paths = sorted(glob.glob(item, recursive=recursive)) or [item]
+
+        for path in paths:
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+
+# ============================================================
+# REPRISE
+# ============================================================
+
+def load_checkpoint(output_path):
+    """Statut de chaque document déjà écrit (la dernière ligne l'emporte)"""
+    done = {}
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, "rb+") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # ligne tronquée par une interruption pendant l'écriture
+                continue
+            done[record["source"]] = record["status"]
+
+        # terminer une éventuelle ligne incomplète avant d'ajouter la suite
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return done
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+def _init_worker():
+    # Ctrl-C est géré par le processus principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def extract_file(path, return_layout=False):
+    """Exécutée dans un worker ; retourne (résultat, début, fin, pid)"""
+    started_at = time.time()
+    with open(path, "rb") as f:
+        header = f.read(8)
+
+    if is_multipage(header):
+        with open(path, "rb") as f:
+            data = f.read()
+        result = merge_page_results(extract_document_info(page) for page in iter_pages(data))
+    else:
+        result = extract_document_info(path, return_layout=return_layout)
+
+    return result, started_at, time.time(), os.getpid()
+
+
+# ============================================================
+# EXÉCUTION
+# ============================================================
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class BatchRun:
+
+    def __init__(self, output_path, ner=False, model_path=None, ner_batch_size=8):
+        self.output_path = output_path
+        self.ner = ner
+        self.model_path = model_path
+        self.ner_batch_size = ner_batch_size
+
+        self.latencies_ms = []
+        self.failures = {}
+        self.ok = 0
+        self._ner_pending = []
+        self._out = None
+
+    def __enter__(self):
+        self._out = open(self.output_path, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc):
+        self.flush_ner()
+        self._out.close()
+
+    def _write(self, record):
+        self._out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._out.flush()
+
+    def record(self, path, future):
+        try:
+            result, started_at, finished_at, pid = future.result()
+        except Exception as e:
+            result, started_at, finished_at, pid = None, None, None, None
+            error = f"{type(e).__name__}: {e}"
+        else:
+            error = result.get("error")
+
+        record = {"source": path, "status": "failed" if error else "ok", "worker_pid": pid}
+        if started_at is not None:
+            record["duration_ms"] = round((finished_at - started_at) * 1000, 1)
+            self.latencies_ms.append(record["duration_ms"])
+        if error:
+            record["error"] = error
+            self.failures[error] = self.failures.get(error, 0) + 1
+        else:
+            self.ok += 1
+        record["result"] = result
+
+        layout = result.pop("layout", None) if result else None
+        if self.ner and not error and not result.get("metadata", {}).get("pages"):
+            # NER par lots dans le processus principal : un seul modèle en mémoire
+            self._ner_pending.append((record, layout))
+            if len(self._ner_pending) >= self.ner_batch_size:
+                self.flush_ner()
+        else:
+            self._write(record)
+
+    def flush_ner(self):
+        if not self._ner_pending:
+            return
+        pending, self._ner_pending = self._ner_pending, []
+
+        import model
+        # mots/boîtes de l'OCR du worker : pas de second passage Tesseract
+        sources = [{"image": r["source"], **layout} if layout else r["source"]
+                   for r, layout in pending]
+        try:
+            entities = model.extract_entities_batch(sources, model_path=self.model_path)
+        except Exception as e:
+            # statut différent de "ok" : la reprise retraitera ces documents
+            error = f"NER: {type(e).__name__}: {e}"
+            for record, _ in pending:
+                record["status"] = "ner_failed"
+                record["error"] = error
+                self._write(record)
+            self.ok -= len(pending)
+            self.failures[error] = self.failures.get(error, 0) + len(pending)
+            return
+        for (record, _), ents in zip(pending, entities):
+            record["result"]["ner_entities"] = ents
+            self._write(record)
+
+    def report(self, elapsed, skipped, interrupted):
+        latencies = sorted(self.latencies_ms)
+        processed = self.ok + sum(self.failures.values())
+        return {
+            "processed": processed,
+            "ok": self.ok,
+            "failed": sum(self.failures.values()),
+            "skipped_already_done": skipped,
+            "interrupted": interrupted,
+            "elapsed_s": round(elapsed, 2),
+            "docs_per_sec": round(processed / elapsed, 2) if elapsed > 0 else None,
+            "latency_ms_p50": percentile(latencies, 0.50),
+            "latency_ms_p95": percentile(latencies, 0.95),
+            "failures_by_error": dict(sorted(self.failures.items(), key=lambda kv: -kv[1])),
+        }
+
+
+def run(paths, output_path, workers, max_in_flight, ner=False, model_path=None,
+        retry_failed=True):
+    done = load_checkpoint(output_path)
+    skip = {p for p, status in done.items() if status == "ok" or not retry_failed}
+
+    start = time.perf_counter()
+    skipped = 0
+    interrupted = False
+
+    with BatchRun(output_path, ner=ner, model_path=model_path) as batch, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        in_flight = {}
+
+        def drain(return_when):
+            finished, _ = wait(in_flight, return_when=return_when)
+            for future in finished:
+                batch.record(in_flight.pop(future), future)
+
+        try:
+            for path in paths:
+                if path in skip:
+                    skipped += 1
+                    continue
+                in_flight[executor.submit(extract_file, path, ner)] = path
+                if len(in_flight) >= max_in_flight:
+                    drain(FIRST_COMPLETED)
+            while in_flight:
+                drain(FIRST_COMPLETED)
+        except KeyboardInterrupt:
+            interrupted = True
+            print("\nInterruption : arrêt après les documents en cours...", file=sys.stderr)
+            for future in in_flight:
+                future.cancel()
+            in_flight = {f: p for f, p in in_flight.items() if not f.cancelled()}
+            drain(ALL_COMPLETED)
+
+    return batch.report(time.perf_counter() - start, skipped, interrupted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction en masse (reprise automatique)")
+    parser.add_argument("inputs", nargs="+",
+                        help="répertoires, motifs glob, ou manifestes (.txt / .jsonl)")
+    parser.add_argument("--output", default="results.jsonl",
+                        help="résultats JSONL, relus pour reprendre un traitement interrompu")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="documents soumis simultanément (défaut : 4 x workers)")
+    parser.add_argument("--recursive", action="store_true", help="parcourir les sous-répertoires")
+    parser.add_argument("--ner", action="store_true", help="ajouter les entités du modèle LayoutLMv3")
+    parser.add_argument("--model", default=None, help="chemin du modèle NER")
+    parser.add_argument("--no-retry-failed", action="store_true",
+                        help="à la reprise, ne pas retraiter les documents en échec")
+    parser.add_argument("--report", help="écrire aussi le bilan en JSON")
+    args = parser.parse_args()
+
+    report = run(
+        list_documents(args.inputs, recursive=args.recursive),
+        args.output,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight or 4 * args.workers,
+        ner=args.ner,
+        model_path=args.model,
+        retry_failed=not args.no_retry_failed,
+    )
+
+    print("\n" + "=" * 60)
+    for key, value in report.items():
+        print(f"{key:<22} {value}")
+    print("=" * 60)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if report["interrupted"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# batching.py
+# Micro-batching : regroupe les requêtes concurrentes pour partager un seul
+# appel `batch_fn(items)` (ex. une passe forward du modèle).
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10):
+        """
+        batch_fn       : fonction liste d'entrées -> liste de résultats (même ordre)
+        max_batch_size : taille maximale d'un lot
+        max_wait_ms    : attente maximale après le premier élément d'un lot
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batches = 0
+        self._items = 0
+
+    def submit(self, item):
+        """Ajouter une entrée ; retourne un Future résolu après le passage du lot"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Attendre un premier élément puis compléter le lot jusqu'à la limite"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            batch = [(item, future) for item, future in batch
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                results = list(results)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+                # batch_fn doit rendre un résultat par élément : ne laisser
+                # aucun appelant bloqué sur .result()
+                for _, future in batch[len(results):]:
+                    future.set_exception(RuntimeError(
+                        f"batch_fn a retourné {len(results)} résultats pour {len(batch)} éléments"))
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else None,
+                "queued": self._queue.qsize(),
+            }
@@ -0,0 +1,2 @@
+# Benchmarks du pipeline AdminDoc-X (à lancer depuis la racine du dépôt :
+# python -m benchmarks.<nom>)
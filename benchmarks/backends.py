@@ -0,0 +1,129 @@
+# benchmarks/backends.py
+# Précision vs latence des backends d'inférence (torch, torch_int8, onnx)
+# sur les derniers documents de train_data.jsonl, ou sur un JSONL held-out explicite.
+#
+#   python -m benchmarks.backends [--holdout 20] [--backends torch torch_int8 onnx]
+#   python -m benchmarks.backends --holdout-jsonl eval_data.jsonl
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+import numpy as np
+from PIL import Image
+
+from model import MODEL_PATH, INFERENCE_BACKENDS, load_model, build_processor
+from benchmarks.corpus import load_jsonl, local_path
+
+
+def holdout_slice(jsonl_path, size):
+    """Les `size` derniers documents du fichier, dans l'ordre : un holdout fixe, mêmes pages à chaque exécution"""
+    items = list(load_jsonl(jsonl_path))
+    return items[-size:]
+
+
+def encode(processor, item, label2id):
+    image_path = local_path(item["image_path"])
+    if os.path.exists(image_path):
+        image = Image.open(image_path).convert("RGB")
+    else:
+        image = Image.new("RGB", (1000, 1000), "white")
+
+    return processor(
+        image,
+        item["words"],
+        boxes=item["boxes"],
+        word_labels=[label2id.get(tag, -100) for tag in item["ner_tags"]],
+        return_tensors="pt",
+        truncation=True,
+    )
+
+
+def run_backend(model_path, backend, items, repeat):
+    loaded = load_model(model_path, backend)
+    processor = build_processor(loaded.tokenizer, apply_ocr=False)
+    label2id = {label: i for i, label in loaded.id2label.items()}
+
+    encodings = [encode(processor, item, label2id) for item in items]
+    inputs = [{k: v for k, v in enc.items() if k != "labels"} for enc in encodings]
+
+    # un forward à vide pour exclure l'initialisation des mesures
+    loaded.forward(inputs[0])
+
+    durations, predictions = [], []
+    for enc in inputs:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            logits = loaded.forward(enc)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        durations.append(best)
+        predictions.append(np.argmax(logits, axis=-1)[0])
+
+    labels = [enc["labels"][0].numpy() for enc in encodings]
+    mask = [lab != -100 for lab in labels]
+    correct = sum(int((pred[m] == lab[m]).sum()) for pred, lab, m in zip(predictions, labels, mask))
+    total = sum(int(m.sum()) for m in mask)
+
+    return {
+        "backend": backend,
+        "ms_per_doc_mean": round(statistics.mean(durations) * 1000, 1),
+        "ms_per_doc_p50": round(statistics.median(durations) * 1000, 1),
+        "token_accuracy": round(correct / total, 4) if total else None,
+    }, predictions, mask
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparaison des backends d'inférence")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--data", default="train_data.jsonl")
+    parser.add_argument("--holdout", type=int, default=20,
+                        help="derniers documents de --data ; doit correspondre au --eval-size de train.py")
+    parser.add_argument("--holdout-jsonl",
+                        help="JSONL held-out jamais vu à l'entraînement (remplace --data/--holdout)")
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS),
+                        choices=INFERENCE_BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3, help="meilleur temps sur N essais")
+    parser.add_argument("--output", help="rapport JSON")
+    args = parser.parse_args()
+
+    if args.holdout_jsonl:
+        items = list(load_jsonl(args.holdout_jsonl))
+    else:
+        items = holdout_slice(args.data, args.holdout)
+        # train.py n'exclut ces documents que s'il a été lancé avec --eval-size >= --holdout
+        print(f"Attention : les {len(items)} derniers documents de {args.data} ne sont held-out "
+              f"que si le modèle a été entraîné avec train.py --eval-size {args.holdout} (ou plus) ; "
+              f"sinon la précision est mesurée sur des données d'entraînement "
+              f"(utiliser --holdout-jsonl pour un jeu séparé).", file=sys.stderr)
+    print(f"{len(items)} documents held-out\n")
+
+    rows, reference = [], None
+    for backend in args.backends:
+        try:
+            row, predictions, mask = run_backend(args.model, backend, items, args.repeat)
+        except Exception as e:
+            print(f"{backend:<12} indisponible : {e}")
+            continue
+
+        # accord avec le premier backend (référence, torch par défaut)
+        if reference is None:
+            reference = predictions
+        same = sum(int((p[m] == r[m]).sum()) for p, r, m in zip(predictions, reference, mask))
+        row["agreement_with_reference"] = round(same / sum(int(m.sum()) for m in mask), 4)
+
+        rows.append(row)
+        print(f"{row['backend']:<12} {row['ms_per_doc_mean']:>8.1f} ms/doc   "
+              f"accuracy {row['token_accuracy']}   accord {row['agreement_with_reference']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "data": args.holdout_jsonl or args.data,
+                       "documents": len(items), "backends": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# benchmarks/corpus.py
+# Sélection des images d'échantillon utilisées par les benchmarks
+import io
+import os
+import glob
+import json
+
+TEST_IMAGE_DIR = "dataset/testing_data/images"
+TRAIN_JSONL = "train_data.jsonl"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff")
+# Page synthétique : format lettre à 200 DPI, comme les pages PDF rastérisées
+SYNTHETIC_PAGE_SIZE = (1700, 2200)
+
+
+def local_path(path):
+    """Les chemins de train_data.jsonl ont été écrits sous Windows"""
+    return os.path.normpath(path.replace("\\", "/"))
+
+
+def load_jsonl(path=TRAIN_JSONL):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def sample_images(paths=None, limit=None):
+    """Images à traiter : arguments CLI, sinon le jeu de test, sinon train_data.jsonl"""
+    images = []
+
+    for path in paths or []:
+        if os.path.isdir(path):
+            images.extend(sorted(
+                p for p in glob.glob(os.path.join(path, "*"))
+                if p.lower().endswith(IMAGE_EXTENSIONS)
+            ))
+        else:
+            images.extend(sorted(glob.glob(path)) or [path])
+
+    if not paths:
+        if os.path.isdir(TEST_IMAGE_DIR):
+            images = sample_images([TEST_IMAGE_DIR])
+        elif os.path.exists(TRAIN_JSONL):
+            images = [local_path(item["image_path"]) for item in load_jsonl()]
+        images = [p for p in images if os.path.exists(p)]
+
+    return images[:limit] if limit else images
+
+
+def text_from_words(words, boxes, line_tolerance=10):
+    """Texte approximatif d'une page annotée : mots regroupés en lignes par ordonnée"""
+    order = sorted(range(len(words)), key=lambda i: (boxes[i][1] // line_tolerance, boxes[i][0]))
+    lines, current, current_y = [], [], None
+    for i in order:
+        y = boxes[i][1] // line_tolerance
+        if current and y != current_y:
+            lines.append(" ".join(current))
+            current = []
+        current.append(words[i])
+        current_y = y
+    if current:
+        lines.append(" ".join(current))
+    return "\n".join(lines)
+
+
+def result_texts(results_json="results_final.json", cache_path=None, limit=None):
+    """
+    Textes OCR des documents listés dans results_*.json : OCR des images du jeu
+    de test (mis en cache dans `cache_path`), sinon texte reconstruit depuis les
+    mots annotés de train_data.jsonl pour pouvoir tourner hors ligne.
+    """
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            texts = json.load(f)
+        return texts[:limit] if limit else texts
+
+    texts = []
+    if os.path.exists(results_json) and os.path.isdir(TEST_IMAGE_DIR):
+        from ocr_llm_extractor import extract_text_with_layout
+
+        with open(results_json, "r", encoding="utf-8") as f:
+            files = [item["file"] for item in json.load(f)]
+        for name in files[:limit]:
+            img_path = os.path.join(TEST_IMAGE_DIR, name)
+            if os.path.exists(img_path):
+                text, _ = extract_text_with_layout(img_path)
+                texts.append({"id": name, "text": text})
+
+    if not texts and os.path.exists(TRAIN_JSONL):
+        for item in load_jsonl():
+            texts.append({"id": item["id"], "text": text_from_words(item["words"], item["boxes"])})
+            if limit and len(texts) >= limit:
+                break
+
+    if cache_path and texts:
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(texts, f, ensure_ascii=False)
+    return texts
+
+
+def render_page(words, boxes, size=SYNTHETIC_PAGE_SIZE):
+    """
+    Page PNG synthétique : chaque mot annoté dessiné dans sa boîte (0-1000),
+    pour benchmarker tout le pipeline sans les images d'origine.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = size
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    fonts = {}
+    for word, (x1, y1, x2, y2) in zip(words, boxes):
+        box_height = max(8, int((y2 - y1) * height / 1000))
+        font_size = min(box_height, 48)
+        if font_size not in fonts:
+            fonts[font_size] = ImageFont.load_default(size=font_size)
+        draw.text((x1 * width / 1000, y1 * height / 1000), word, fill=0, font=fonts[font_size])
+
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def labeled_pages(source="auto", limit=None):
+    """
+    Pages annotées de train_data.jsonl (mots, boîtes, étiquettes FUNSD) avec
+    les octets de l'image : l'image d'origine si elle existe ("auto",
+    "images"), sinon une page rendue à partir des mots ("synthetic").
+    """
+    pages = []
+    for item in load_jsonl():
+        img_path = local_path(item["image_path"])
+        if source != "synthetic" and os.path.exists(img_path):
+            with open(img_path, "rb") as f:
+                image, origin = f.read(), "image"
+        elif source == "images":
+            continue
+        else:
+            image, origin = render_page(item["words"], item["boxes"]), "synthetic"
+
+        pages.append({"id": item["id"], "image": image, "origin": origin,
+                      "words": item["words"], "boxes": item["boxes"],
+                      "ner_tags": item["ner_tags"]})
+        if limit and len(pages) >= limit:
+            break
+    return pages
@@ -0,0 +1,182 @@
+# benchmarks/legacy_rules.py
+# Implémentation des règles avant le moteur précompilé (rules.py), conservée
+# telle quelle comme référence « avant » pour benchmarks.rules.
+import re
+
+import dateparser
+
+
+def find_document_type(text):
+    """Détecter le type de document"""
+    text_lower = text.lower()
+    
+    if any(word in text_lower for word in ['unesco', 'memoire du monde', 'organisation des nations unies']):
+        return "certificat_unesco"
+    elif any(word in text_lower for word in ['archives nationales', 'présidence du gouvernement', 'république tunisienne']):
+        return "document_administratif_tunisien"
+    elif any(word in text_lower for word in ['horaires', 'horaire', 'ouverture', 'salle de lecture']):
+        return "horaire_ouverture"
+    elif any(word in text_lower for word in ['inscription', 'certificat', 'registration']):
+        return "certificat"
+    else:
+        return "document_generique"
+
+def extract_date_advanced(text):
+    """Extraction avancée des dates"""
+    dates_found = []
+    
+    # Patterns de dates
+    date_patterns = [
+        r'(\d{1,2}\s+(?:janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre)\s+\d{4})',
+        r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
+        r'(\d{1,2}\s+[A-Za-zÀ-ÿ]+\s+\d{4})',
+        r'le\s+(\d{1,2}\s+[A-Za-zÀ-ÿ]+\s+\d{4})',
+        r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
+    ]
+    
+    for pattern in date_patterns:
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        for match in matches:
+            try:
+                # Essayer de parser la date
+                parsed_date = dateparser.parse(match, languages=['fr', 'en'])
+                if parsed_date:
+                    dates_found.append({
+                        'raw': match,
+                        'parsed': parsed_date.strftime('%Y-%m-%d'),
+                        'iso': parsed_date.isoformat()
+                    })
+            except:
+                continue
+    
+    return dates_found
+
+def extract_entities_structured(text, data_dict=None):
+    """Extraction structurée des entités"""
+    entities = {
+        "document_type": None,
+        "title": None,
+        "organization": None,
+        "date": None,
+        "location": None,
+        "reference_number": None,
+        "contact_info": {},
+        "persons": [],
+        "dates": [],
+        "addresses": [],
+        "phone_numbers": [],
+        "emails": [],
+        "urls": []
+    }
+    
+    # 1. Type de document
+    entities["document_type"] = find_document_type(text)
+    
+    # 2. Titre (premières lignes significatives)
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    if len(lines) > 0:
+        # Prendre les premières lignes non-vides comme titre potentiel
+        title_candidates = []
+        for line in lines[:5]:  # Regarder les 5 premières lignes
+            if len(line) > 10 and not any(word in line.lower() for word in 
+                                         ['date', 'n°', 'numéro', 'téléphone', 'email', 'www']):
+                title_candidates.append(line)
+        
+        if title_candidates:
+            entities["title"] = title_candidates[0]
+    
+    # 3. Numéro de référence
+    ref_patterns = [
+        r'N[°ºo]\s*[:]?\s*([A-Z0-9\-/]+)',
+        r'Ref[ée]rence\s*[:]?\s*([A-Z0-9\-/]+)',
+        r'Num[ée]ro\s*[:]?\s*([A-Z0-9\-/]+)',
+        r'ID\s*[:]?\s*([A-Z0-9\-/]+)'
+    ]
+    
+    for pattern in ref_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            entities["reference_number"] = match.group(1).strip()
+            break
+    
+    # 4. Dates
+    entities["dates"] = extract_date_advanced(text)
+    if entities["dates"]:
+        entities["date"] = entities["dates"][0]['parsed']  # Première date trouvée
+    
+    # 5. Organisation
+    org_keywords = ['UNESCO', 'Archives Nationales', 'Présidence du gouvernement', 
+                   'République Tunisienne', 'Organisation des Nations Unies']
+    
+    for keyword in org_keywords:
+        if keyword.lower() in text.lower():
+            entities["organization"] = keyword
+            break
+    
+    # 6. Localisation (ville, pays)
+    location_patterns = [
+        r'à\s+([A-Za-zÀ-ÿ]+)',
+        r'([A-Za-zÀ-ÿ]+)\s+Tunisie',
+        r'Tunis\s+([A-Za-zÀ-ÿ]+)'
+    ]
+    
+    for pattern in location_patterns:
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        if matches:
+            entities["location"] = matches[0]
+            break
+    
+    # 7. Informations de contact
+    # Numéros de téléphone
+    phone_matches = re.findall(r'\(?\d{2,4}\)?[\s\-]?\d{2,3}[\s\-]?\d{2,3}[\s\-]?\d{2,3}', text)
+    entities["phone_numbers"] = phone_matches
+    
+    # Emails
+    email_matches = re.findall(r'[\w\.-]+@[\w\.-]+\.\w+', text)
+    entities["emails"] = email_matches
+    
+    # URLs
+    url_matches = re.findall(r'www\.\S+|\bhttps?://\S+', text)
+    entities["urls"] = url_matches
+    
+    # 8. Adresses
+    address_patterns = [
+        r'\d+,\s+[A-Za-zÀ-ÿ\s\d]+,\s+\d+\s+[A-Za-zÀ-ÿ]+',
+        r'[A-Za-zÀ-ÿ\s]+,\s+\d+\s+[A-Za-zÀ-ÿ]+',
+        r'\d+\s+[A-Za-zÀ-ÿ\s]+\s+\d{4,5}\s+[A-Za-zÀ-ÿ]+'
+    ]
+    
+    for pattern in address_patterns:
+        matches = re.findall(pattern, text)
+        if matches:
+            entities["addresses"].extend(matches)
+    
+    # 9. Personnes (noms propres suivis de titres)
+    person_patterns = [
+        r'(M\.|Mme|Mlle|Dr|Prof|Directeur|Directrice)\s+([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)',
+        r'([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)\s+\(([^)]+)\)',
+        r'Sign[ée]\s+par\s+([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)'
+    ]
+    
+    for pattern in person_patterns:
+        matches = re.findall(pattern, text)
+        for match in matches:
+            if isinstance(match, tuple):
+                name = match[1] if len(match) > 1 else match[0]
+            else:
+                name = match
+            
+            if name not in entities["persons"] and len(name.split()) >= 2:
+                entities["persons"].append(name)
+    
+    # 10. Informations de contact structurées
+    if entities["phone_numbers"]:
+        entities["contact_info"]["telephone"] = entities["phone_numbers"][0]
+    if entities["emails"]:
+        entities["contact_info"]["email"] = entities["emails"][0]
+    if entities["addresses"]:
+        entities["contact_info"]["address"] = entities["addresses"][0]
+    if entities["urls"]:
+        entities["contact_info"]["website"] = entities["urls"][0]
+    
+    return entities
@@ -0,0 +1,102 @@
+# benchmarks/ocr_backends.py
+# Débit OCR : pytesseract (un processus par appel) contre tesserocr (moteurs
+# persistants), à concurrence égale, et parité du texte reconstruit.
+#
+#   python -m benchmarks.ocr_backends [images|dossier ...] [--limit 20] [--concurrency 4]
+import json
+import time
+import argparse
+import difflib
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import ocr_backends
+from ocr_llm_extractor import preprocess_image_for_ocr, text_from_ocr_data, OCR_CONFIG
+from benchmarks.corpus import sample_images
+
+
+def prepared_images(paths):
+    images = []
+    for img_path in paths:
+        processed = preprocess_image_for_ocr(img_path)
+        images.append(Image.fromarray(processed) if isinstance(processed, np.ndarray) else processed)
+    return images
+
+
+def run_backend(name, images, lang, concurrency, rounds):
+    backend = ocr_backends.get_backend(name)
+
+    # premier appel à froid (chargement des traineddata pour tesserocr)
+    start = time.perf_counter()
+    backend.image_to_data(images[0], lang, OCR_CONFIG)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    def ocr(image):
+        start = time.perf_counter()
+        data = backend.image_to_data(image, lang, OCR_CONFIG)
+        return text_from_ocr_data(data), (time.perf_counter() - start) * 1000
+
+    work = images * rounds
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(ocr, work))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(ms for _, ms in results)
+    return {
+        "backend": name,
+        "cold_ms": round(cold_ms, 1),
+        "pages_per_sec": round(len(work) / elapsed, 2),
+        "latency_ms_mean": round(statistics.mean(latencies), 1),
+        "latency_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 1),
+        "stats": backend.stats(),
+    }, [text for text, _ in results[:len(images)]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit OCR pytesseract vs tesserocr")
+    parser.add_argument("images", nargs="*", help="images, dossiers ou motifs glob")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--lang", default="fra+eng")
+    parser.add_argument("--concurrency", type=int, default=ocr_backends.OCR_ENGINE_POOL_SIZE)
+    parser.add_argument("--rounds", type=int, default=1, help="passages sur l'échantillon")
+    parser.add_argument("--backends", nargs="+", default=list(ocr_backends.OCR_BACKENDS),
+                        choices=ocr_backends.OCR_BACKENDS)
+    parser.add_argument("--output", help="rapport JSON")
+    args = parser.parse_args()
+
+    images = prepared_images(sample_images(args.images, args.limit))
+    if not images:
+        parser.error("aucune image trouvée")
+
+    rows, texts = [], {}
+    for name in args.backends:
+        row, texts[name] = run_backend(name, images, args.lang, args.concurrency, args.rounds)
+        rows.append(row)
+        print(f"{name:<12} à froid {row['cold_ms']:>8.1f} ms   {row['pages_per_sec']:>6.2f} pages/s   "
+              f"moyenne {row['latency_ms_mean']:>8.1f} ms   p95 {row['latency_ms_p95']:>8.1f} ms")
+
+    reference = args.backends[0]
+    for name in args.backends[1:]:
+        similarity = statistics.mean(
+            difflib.SequenceMatcher(None, a, b).ratio()
+            for a, b in zip(texts[reference], texts[name]))
+        exact = sum(a == b for a, b in zip(texts[reference], texts[name]))
+        print(f"{name} vs {reference}: similarité {similarity:.4f}, "
+              f"textes identiques {exact}/{len(images)}")
+        for row in rows:
+            if row["backend"] == name:
+                row["similarity_vs_reference"] = round(similarity, 4)
+                row["exact_match"] = exact
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"images": len(images), "concurrency": args.concurrency,
+                       "rounds": args.rounds, "backends": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/ocr_passes.py
+# Latence et parité du texte : OCR en un passage (image_to_data seul)
+# contre deux passages (image_to_string + image_to_data), et OCR parallèle
+# par régions (grandes pages) contre un passage.
+#
+#   python -m benchmarks.ocr_passes [images|dossier ...] [--limit 20]
+import argparse
+import difflib
+import json
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from ocr_llm_extractor import preprocess_image_for_ocr, run_ocr, OCR_MODES
+from benchmarks.corpus import sample_images
+
+
+def normalize_ws(text):
+    return " ".join(text.split())
+
+
+def benchmark_image(img_path, lang, repeat):
+    processed = preprocess_image_for_ocr(img_path)
+    pil_image = Image.fromarray(processed) if isinstance(processed, np.ndarray) else processed
+
+    row = {"image": img_path}
+    texts = {}
+    for mode in OCR_MODES:
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            texts[mode], _ = run_ocr(pil_image, lang=lang, mode=mode)
+            durations.append(time.perf_counter() - start)
+        row[f"{mode}_ms"] = round(min(durations) * 1000, 1)
+
+    row["exact_match"] = texts["single"] == texts["double"]
+    row["ws_match"] = normalize_ws(texts["single"]) == normalize_ws(texts["double"])
+    row["similarity"] = round(
+        difflib.SequenceMatcher(None, texts["single"], texts["double"]).ratio(), 4)
+    row["regions_similarity"] = round(
+        difflib.SequenceMatcher(None, texts["single"], texts["regions"]).ratio(), 4)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR un passage vs deux passages vs régions parallèles")
+    parser.add_argument("images", nargs="*", help="images, dossiers ou motifs glob")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--lang", default="fra+eng")
+    parser.add_argument("--repeat", type=int, default=1, help="meilleur temps sur N essais")
+    parser.add_argument("--output", help="rapport JSON")
+    args = parser.parse_args()
+
+    images = sample_images(args.images, args.limit)
+    if not images:
+        parser.error("aucune image trouvée")
+
+    rows = []
+    for img_path in images:
+        row = benchmark_image(img_path, args.lang, args.repeat)
+        rows.append(row)
+        print(f"{row['image']:<50} double {row['double_ms']:>8.1f} ms   "
+              f"single {row['single_ms']:>8.1f} ms   similarité {row['similarity']:.4f}   "
+              f"regions {row['regions_ms']:>8.1f} ms   similarité {row['regions_similarity']:.4f}")
+
+    summary = {
+        "images": len(rows),
+        "double_ms_mean": round(statistics.mean(r["double_ms"] for r in rows), 1),
+        "single_ms_mean": round(statistics.mean(r["single_ms"] for r in rows), 1),
+        "exact_match": sum(r["exact_match"] for r in rows),
+        "whitespace_match": sum(r["ws_match"] for r in rows),
+        "similarity_mean": round(statistics.mean(r["similarity"] for r in rows), 4),
+        "regions_ms_mean": round(statistics.mean(r["regions_ms"] for r in rows), 1),
+        "regions_similarity_mean": round(statistics.mean(r["regions_similarity"] for r in rows), 4),
+    }
+    summary["speedup"] = round(summary["double_ms_mean"] / summary["single_ms_mean"], 2)
+    summary["regions_speedup"] = round(summary["single_ms_mean"] / summary["regions_ms_mean"], 2)
+
+    print("\n" + "=" * 60)
+    for key, value in summary.items():
+        print(f"{key:<20} {value}")
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "images": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# benchmarks/pipeline.py
+# Benchmark de bout en bout OCR + règles (+ NER) sur un corpus fixe :
+# pages annotées de train_data.jsonl (images d'origine, ou pages rendues
+# depuis les mots annotés pour tourner hors ligne).
+#
+#   python -m benchmarks.pipeline [--limit 20] [--workers 1 2 4] [--ner]
+#                                 [--source auto|images|synthetic]
+#                                 [--output report.json] [--baseline ancien.json]
+#
+# Le rapport JSON (clés triées, valeurs arrondies) se compare d'un commit à
+# l'autre avec `diff` ou avec --baseline.
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from ocr_llm_extractor import extract_document_info, pipeline_config
+from benchmarks.corpus import labeled_pages
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(values):
+    return {
+        "mean": round(statistics.mean(values), 2),
+        "p50": round(percentile(values, 0.50), 2),
+        "p95": round(percentile(values, 0.95), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Pic de mémoire résidente (ru_maxrss : Ko sous Linux, octets sous macOS)"""
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ============================================================
+# LATENCE PAR ÉTAPE
+# ============================================================
+
+def word_recall(gold_words, ocr_words):
+    """Part des mots annotés retrouvés par l'OCR (multiensemble, casse ignorée)"""
+    found = Counter(w.lower() for w in ocr_words)
+    hits = 0
+    for word in gold_words:
+        word = word.lower()
+        if found[word] > 0:
+            found[word] -= 1
+            hits += 1
+    return hits / len(gold_words) if gold_words else 1.0
+
+
+def run_stages(pages):
+    """Une page après l'autre dans ce processus : metadata.timings_ms de chaque page"""
+    stages, recalls, failed = {}, [], 0
+
+    # première page à froid (imports paresseux, caches) hors mesures
+    extract_document_info(pages[0]["image"])
+
+    for page in pages:
+        result = extract_document_info(page["image"], return_layout=True)
+        if "error" in result:
+            failed += 1
+            continue
+        for name, ms in result["metadata"]["timings_ms"].items():
+            stages.setdefault(name, []).append(ms)
+        layout = result.get("layout") or {"words": []}
+        recalls.append(word_recall(page["words"], layout["words"]))
+
+    return {
+        "failed": failed,
+        "stages_ms": {name: summarize(values) for name, values in sorted(stages.items())},
+        "ocr_word_recall": round(statistics.mean(recalls), 4) if recalls else None,
+    }
+
+
+# ============================================================
+# DÉBIT
+# ============================================================
+
+def run_throughput(pages, workers):
+    """Pages/s avec `workers` processus (même chemin que /jobs et batch_extract)"""
+    images = [page["image"] for page in pages]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # démarrage des workers et imports hors mesure
+        list(executor.map(extract_document_info, images[:workers]))
+
+        start = time.perf_counter()
+        latencies, failed = [], 0
+        for result in executor.map(extract_document_info, images):
+            latencies.append(result["metadata"]["processing_time_ms"])
+            failed += "error" in result
+        elapsed = time.perf_counter() - start
+
+    return {
+        "workers": workers,
+        "failed": failed,
+        "pages_per_sec": round(len(images) / elapsed, 3),
+        "elapsed_s": round(elapsed, 2),
+        "latency_ms": summarize(latencies),
+    }
+
+
+# ============================================================
+# NER
+# ============================================================
+
+def bio_spans(tags):
+    """Spans (type, début, fin) d'une séquence BIO, même règle que model.decode_entities"""
+    spans, current = [], None
+    for i, tag in enumerate(list(tags) + ["O"]):
+        kind = tag[2:] if tag != "O" else None
+        if current and (kind != current[0] or tag.startswith("B-")):
+            spans.append((current[0], current[1], i))
+            current = None
+        if kind and current is None:
+            current = [kind, i]
+    return spans
+
+
+def span_scores(gold, predicted):
+    """Précision / rappel / F1 au niveau des entités (correspondance exacte des spans)"""
+    labels = sorted({s[0] for s in gold} | {s[0] for s in predicted})
+    scores = {}
+    for label in labels + [None]:
+        g = {s for s in gold if label is None or s[0] == label}
+        p = {s for s in predicted if label is None or s[0] == label}
+        tp = len(g & p)
+        precision = tp / len(p) if p else 0.0
+        recall = tp / len(g) if g else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        scores[label or "overall"] = {"precision": round(precision, 4), "recall": round(recall, 4),
+                                      "f1": round(f1, 4), "support": len(g)}
+    return scores
+
+
+def run_ner(pages, batch_size, model_path=None):
+    """
+    NER sur les mots/boîtes annotés : l'exactitude mesure le modèle seul, sans
+    les erreurs d'OCR, face aux étiquettes FUNSD de train_data.jsonl.
+    """
+    import model
+
+    model.get_model(model_path)
+    gold, predicted, latencies = [], [], []
+    for start in range(0, len(pages), batch_size):
+        batch = pages[start:start + batch_size]
+        sources = [{"image": p["image"], "words": p["words"], "boxes": p["boxes"]} for p in batch]
+
+        t0 = time.perf_counter()
+        entities = model.extract_entities_batch(sources, batch_size=batch_size,
+                                                model_path=model_path)
+        latencies.append((time.perf_counter() - t0) * 1000 / len(batch))
+
+        for doc, (page, ents) in enumerate(zip(batch, entities), start):
+            # (type, document, début, fin) : un span n'est juste que dans son document
+            gold.extend((kind, doc, begin, end) for kind, begin, end in bio_spans(page["ner_tags"]))
+            predicted.extend((label, doc, span["start"], span["end"])
+                             for label, spans in ents.items() if label != "DOC_TYPE"
+                             for span in spans)
+
+    return {"batch_size": batch_size, "latency_ms_per_page": summarize(latencies),
+            "entities": span_scores(gold, predicted)}
+
+
+# ============================================================
+# RAPPORT
+# ============================================================
+
+def compare(report, baseline):
+    """Écarts principaux par rapport à un rapport précédent"""
+    lines = []
+
+    def delta(name, new, old, higher_is_better=False):
+        if new is None or not old:
+            return
+        change = 100 * (new - old) / old
+        better = change > 0 if higher_is_better else change < 0
+        lines.append(f"  {name:<36} {old:>10} -> {new:<10} {change:+6.1f}% "
+                     f"{'mieux' if better else 'moins bien' if change else ''}")
+
+    old_stages = baseline.get("stages", {}).get("stages_ms", {})
+    for name, values in report["stages"]["stages_ms"].items():
+        delta(f"{name} p50 (ms)", values["p50"], old_stages.get(name, {}).get("p50"))
+    old_tp = {row["workers"]: row for row in baseline.get("throughput", [])}
+    for row in report["throughput"]:
+        delta(f"{row['workers']} worker(s) pages/s", row["pages_per_sec"],
+              old_tp.get(row["workers"], {}).get("pages_per_sec"), higher_is_better=True)
+    delta("peak RSS workers (MB)", report["peak_rss_mb"]["workers"],
+          baseline.get("peak_rss_mb", {}).get("workers"))
+    delta("OCR word recall", report["stages"]["ocr_word_recall"],
+          baseline.get("stages", {}).get("ocr_word_recall"), higher_is_better=True)
+    if "ner" in report and "ner" in baseline:
+        delta("NER F1", report["ner"]["entities"]["overall"]["f1"],
+              baseline["ner"]["entities"]["overall"]["f1"], higher_is_better=True)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout du pipeline")
+    parser.add_argument("--source", default="auto", choices=("auto", "images", "synthetic"),
+                        help="images d'origine, pages rendues depuis les annotations, ou les deux")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--ner", action="store_true", help="mesurer aussi le modèle LayoutLMv3")
+    parser.add_argument("--ner-batch-size", type=int, default=8)
+    parser.add_argument("--model", default=None, help="chemin du modèle NER")
+    parser.add_argument("--output", help="rapport JSON")
+    parser.add_argument("--baseline", help="rapport JSON d'un commit précédent à comparer")
+    args = parser.parse_args()
+
+    pages = labeled_pages(args.source, args.limit)
+    if not pages:
+        parser.error("aucune page annotée trouvée (train_data.jsonl)")
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pipeline": pipeline_config(),
+        "corpus": {"source": args.source, "pages": len(pages),
+                   "origins": dict(Counter(p["origin"] for p in pages)),
+                   "words": sum(len(p["words"]) for p in pages)},
+    }
+
+    report["stages"] = run_stages(pages)
+    print(f"{'étape':<12} {'moyenne':>10} {'p50':>10} {'p95':>10}   (ms)")
+    for name, values in report["stages"]["stages_ms"].items():
+        print(f"{name:<12} {values['mean']:>10} {values['p50']:>10} {values['p95']:>10}")
+    print(f"rappel des mots OCR : {report['stages']['ocr_word_recall']}")
+
+    report["throughput"] = []
+    for workers in args.workers:
+        row = run_throughput(pages, workers)
+        report["throughput"].append(row)
+        print(f"{workers:>2} worker(s) : {row['pages_per_sec']:>7.3f} pages/s   "
+              f"p50 {row['latency_ms']['p50']:>9} ms   p95 {row['latency_ms']['p95']:>9} ms")
+
+    if args.ner:
+        report["ner"] = run_ner(pages, args.ner_batch_size, args.model)
+        overall = report["ner"]["entities"]["overall"]
+        print(f"NER : {report['ner']['latency_ms_per_page']['mean']} ms/page, "
+              f"P {overall['precision']} R {overall['recall']} F1 {overall['f1']}")
+
+    # pic du processus principal (OCR séquentiel, modèle) et du plus gros worker
+    report["peak_rss_mb"] = {"main": peak_rss_mb(), "workers": peak_rss_mb(resource.RUSAGE_CHILDREN)}
+    print(f"pic RSS : principal {report['peak_rss_mb']['main']} MB, "
+          f"workers {report['peak_rss_mb']['workers']} MB")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nComparaison avec {args.baseline} (commit {baseline.get('commit')}) :")
+        print("\n".join(compare(report, baseline)) or "  rien de comparable")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/preprocess.py
+# Précision OCR vs temps de prétraitement, par profil ("none", "fast",
+# "quality", "auto"), sur les images annotées de train_data.jsonl.
+# Précision = rappel des mots annotés retrouvés dans le texte OCR.
+#
+#   python -m benchmarks.preprocess [--limit 20] [--profiles fast quality auto]
+import os
+import re
+import json
+import time
+import argparse
+import statistics
+from collections import Counter
+
+import numpy as np
+from PIL import Image
+
+from ocr_llm_extractor import preprocess_image_for_ocr, run_ocr
+from preprocessing import PREPROCESS_PROFILES
+from benchmarks.corpus import load_jsonl, local_path
+
+
+def normalize_words(words):
+    words = (re.sub(r"[^\w]", "", w.lower()) for w in words)
+    return Counter(w for w in words if w)
+
+
+def word_recall(text, gt_words):
+    expected = normalize_words(gt_words)
+    found = normalize_words(text.split())
+    total = sum(expected.values())
+    return sum((expected & found).values()) / total if total else None
+
+
+def annotated_images(jsonl_path, limit):
+    items = []
+    for item in load_jsonl(jsonl_path):
+        path = local_path(item["image_path"])
+        if os.path.exists(path):
+            items.append((path, item["words"]))
+            if limit and len(items) >= limit:
+                break
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profils de prétraitement : précision vs ms")
+    parser.add_argument("--data", default="train_data.jsonl")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--profiles", nargs="+", default=list(PREPROCESS_PROFILES),
+                        choices=PREPROCESS_PROFILES)
+    parser.add_argument("--output", help="rapport JSON")
+    args = parser.parse_args()
+
+    items = annotated_images(args.data, args.limit)
+    if not items:
+        parser.error("aucune image annotée trouvée (dataset/training_data/images)")
+
+    report = {}
+    for profile in args.profiles:
+        pre_ms, ocr_ms, recalls, chosen = [], [], [], Counter()
+        stage_ms = {}
+        for img_path, gt_words in items:
+            info = {}
+            start = time.perf_counter()
+            processed = preprocess_image_for_ocr(img_path, profile=profile, info=info)
+            pre_ms.append((time.perf_counter() - start) * 1000)
+
+            pil_image = Image.fromarray(processed) if isinstance(processed, np.ndarray) else processed
+            start = time.perf_counter()
+            text, _ = run_ocr(pil_image)
+            ocr_ms.append((time.perf_counter() - start) * 1000)
+
+            recalls.append(word_recall(text, gt_words))
+            chosen[info.get("profile", profile)] += 1
+            for stage, ms in info.get("timings_ms", {}).items():
+                stage_ms.setdefault(stage, []).append(ms)
+
+        report[profile] = {
+            "preprocess_ms_mean": round(statistics.mean(pre_ms), 1),
+            "ocr_ms_mean": round(statistics.mean(ocr_ms), 1),
+            "word_recall_mean": round(statistics.mean(r for r in recalls if r is not None), 4),
+            "stages_ms_mean": {k: round(statistics.mean(v), 2) for k, v in stage_ms.items()},
+            "profiles_used": dict(chosen),
+        }
+        row = report[profile]
+        print(f"{profile:<8} prétraitement {row['preprocess_ms_mean']:>8.1f} ms   "
+              f"OCR {row['ocr_ms_mean']:>8.1f} ms   rappel mots {row['word_recall_mean']:.4f}   "
+              f"{row['profiles_used']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"images": len(items), "profiles": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/rules.py
+# Temps d'extraction par document des règles (extract_entities_structured),
+# avant (benchmarks/legacy_rules.py) et après le moteur précompilé (rules.py),
+# avec vérification que les deux produisent le même résultat, et que les
+# parcours uniques (rules.PatternScanner) trouvent la même chose qu'un
+# finditer par motif.
+#
+#   python -m benchmarks.rules [--texts-cache texts.json] [--repeat 5]
+import json
+import time
+import argparse
+import statistics
+
+import rules
+import date_normalizer
+import ocr_llm_extractor
+from benchmarks import legacy_rules
+from benchmarks.corpus import result_texts
+
+
+def time_per_document(fn, texts, repeat):
+    """Meilleur temps (ms) sur `repeat` essais, pour chaque document"""
+    timings = []
+    for item in texts:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(item["text"])
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best * 1000)
+    return timings
+
+
+def findall_format(match):
+    """Match au format de re.findall (texte, groupe unique ou tuple de groupes)"""
+    groups = match.groups()
+    if not groups:
+        return match.group(0)
+    return groups[0] if len(groups) == 1 else groups
+
+
+def scanner_parity(text):
+    """Noms des listes de motifs dont le parcours unique diffère d'un finditer par motif"""
+    differs = []
+    for name, regexes, scanner in (("addresses", rules.ADDRESS_RES, rules.ADDRESS_SCANNER),
+                                   ("persons", rules.PERSON_RES, rules.PERSON_SCANNER)):
+        sequential = [m for regex in regexes for m in regex.findall(text)]
+        if sequential != [findall_format(match) for _, match in scanner.scan(text)]:
+            differs.append(name)
+
+    sequential = [(index, m.start(1), m.end(1), m.group(1))
+                  for index, regex in enumerate(rules.DATE_RES) for m in regex.finditer(text)]
+    if sorted(sequential) != sorted(date_normalizer.find_date_candidates(text)):
+        differs.append("dates")
+    return differs
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "total_ms": round(sum(timings), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark des règles d'extraction")
+    parser.add_argument("--results", default="results_final.json")
+    parser.add_argument("--texts-cache", help="fichier JSON où garder les textes OCR")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="rapport JSON")
+    args = parser.parse_args()
+
+    texts = result_texts(args.results, args.texts_cache, args.limit)
+    if not texts:
+        parser.error("aucun texte disponible")
+
+    mismatches = [item["id"] for item in texts
+                  if legacy_rules.extract_entities_structured(item["text"])
+                  != ocr_llm_extractor.extract_entities_structured(item["text"])]
+
+    scanner_mismatches = {}
+    for item in texts:
+        for name in scanner_parity(item["text"]):
+            scanner_mismatches.setdefault(name, []).append(item["id"])
+
+    before = summarize(time_per_document(legacy_rules.extract_entities_structured, texts, args.repeat))
+    after = summarize(time_per_document(ocr_llm_extractor.extract_entities_structured, texts, args.repeat))
+
+    print(f"{len(texts)} documents, meilleur de {args.repeat} essais\n")
+    print(f"{'':<8} {'moyenne':>10} {'p50':>10} {'p95':>10}   (ms / document)")
+    for name, stats in (("avant", before), ("après", after)):
+        print(f"{name:<8} {stats['mean_ms']:>10.3f} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f}")
+    print(f"\naccélération : x{before['mean_ms'] / after['mean_ms']:.2f}")
+    print(f"résultats différents : {len(mismatches)} {mismatches[:10] if mismatches else ''}")
+    for name in ("addresses", "persons", "dates"):
+        ids = scanner_mismatches.get(name, [])
+        print(f"parcours unique {name:<10} différent d'un finditer par motif : "
+              f"{len(ids)} {ids[:10] if ids else ''}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"documents": len(texts), "before": before, "after": after,
+                       "mismatches": mismatches, "scanner_mismatches": scanner_mismatches},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
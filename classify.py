@@ -0,0 +1,85 @@
+# classify.py
+# Classification rapide avant le passage complet : OCR de l'en-tête de la
+# page réduite en résolution, puis les mots-clés de types de rules.py. Le
+# type choisit le profil de prétraitement, les langues Tesseract et les
+# règles du passage complet (rules.DOCUMENT_TYPE_SETTINGS), ou le remplace
+# entièrement pour les types dont l'en-tête suffit.
+import os
+import logging
+
+import cv2
+from PIL import Image
+
+import metrics
+import ocr_backends
+import rules
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+logger = logging.getLogger(__name__)
+
+# Part haute de la page lue pour classer (logo, organisme, intitulé)
+CLASSIFY_HEADER_FRACTION = float(os.environ.get("ADMINDOC_CLASSIFY_HEADER", 0.25))
+# Largeur de l'en-tête après réduction (les mots-clés sont en gros caractères)
+CLASSIFY_WIDTH = int(os.environ.get("ADMINDOC_CLASSIFY_WIDTH", 1000))
+# Types pour lesquels l'en-tête suffit : pas de passage complet
+HEADER_ONLY_TYPES = frozenset(
+    t.strip() for t in os.environ.get("ADMINDOC_HEADER_ONLY_TYPES", "").split(",") if t.strip())
+# Choix du profil et des langues d'après l'en-tête (un OCR d'en-tête de plus
+# par page) ; le saut du passage complet dépend seulement de HEADER_ONLY_TYPES
+CLASSIFY_ENABLED = os.environ.get("ADMINDOC_CLASSIFY", "1") == "1"
+
+CLASSIFY_CONFIG = r'--oem 3 --psm 3'
+
+
+def header_image(gray, fraction=CLASSIFY_HEADER_FRACTION, width=CLASSIFY_WIDTH):
+    """Haut de la page, réduit à `width` pixels de large et binarisé (Otsu)"""
+    header = gray[:max(1, int(gray.shape[0] * fraction))]
+    if header.shape[1] > width:
+        height = max(1, round(header.shape[0] * width / header.shape[1]))
+        header = cv2.resize(header, (width, height), interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(header, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+
+def to_page_coords(data, scale, page_size):
+    """Données image_to_data de l'en-tête réduit -> coordonnées de la page entière"""
+    width, height = page_size
+    for key in ("left", "top", "width", "height"):
+        data[key] = [round(v * scale) for v in data[key]]
+    for i, level in enumerate(data["level"]):
+        if level == 1:
+            data["width"][i], data["height"][i] = width, height
+    return data
+
+
+def classify(gray, lang):
+    """
+    Type de document d'après l'en-tête (niveaux de gris, numpy 2D).
+    Retourne (type, texte de l'en-tête, données image_to_data en coordonnées
+    page) ; rules.DEFAULT_DOCUMENT_TYPE si aucun mot-clé n'apparaît (le
+    passage complet décidera).
+    """
+    with metrics.stage("classify"):
+        header = header_image(gray)
+        try:
+            # image_to_data : même passage que image_to_string, et les mots
+            # gardent leurs boîtes (layout des types "en-tête seul")
+            data = ocr_backends.get_backend().image_to_data(Image.fromarray(header), lang,
+                                                            CLASSIFY_CONFIG)
+        except Exception as e:
+            # sans classification, le passage complet garde les réglages par défaut
+            logger.warning("Erreur OCR de l'en-tête: %s", e)
+            return rules.DEFAULT_DOCUMENT_TYPE, "", None
+        text = ocr_backends.text_from_ocr_data(data)
+        document_type = rules.match_document_type(rules.keyword_hits(text))
+        data = to_page_coords(data, gray.shape[1] / header.shape[1],
+                              (gray.shape[1], gray.shape[0]))
+    return document_type, text, data
+
+
+def settings_for(document_type):
+    """Réglages du passage complet pour ce type (vide : réglages par défaut)"""
+    return rules.DOCUMENT_TYPE_SETTINGS.get(document_type, {})
@@ -0,0 +1,141 @@
+# date_normalizer.py
+# Normalisation des dates brutes avec mémoïsation : les mêmes chaînes
+# (« 12 mars 2019 », « 9/3/92 ») reviennent souvent dans le corpus, et
+# dateparser est l'appel le plus coûteux des règles.
+import os
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+import rules
+import metrics
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+DATE_CACHE_SIZE = int(os.environ.get("ADMINDOC_DATE_CACHE_SIZE", 4096))
+DATE_LANGUAGES = ['fr', 'en']
+# Référence fixe pour les chaînes incomplètes (« 12 mars », « mars 2019 ») :
+# résolues contre « maintenant », elles changeraient d'un jour à l'autre
+# alors que le cache et le cache des résultats les gardent. Midi : une
+# vraie date est à minuit, un résultat égal à la référence signale que
+# dateparser n'a rien tiré de la chaîne (« 00 M 2500 »).
+DATE_RELATIVE_BASE = datetime.fromisoformat(
+    os.environ.get("ADMINDOC_DATE_RELATIVE_BASE", "2000-01-01T12:00"))
+DATE_SETTINGS = {
+    "RELATIVE_BASE": DATE_RELATIVE_BASE,
+    "PREFER_DATES_FROM": "current_period",
+    "PREFER_DAY_OF_MONTH": "first",
+}
+
+
+class DateNormalizer:
+
+    def __init__(self, max_entries=DATE_CACHE_SIZE, languages=DATE_LANGUAGES,
+                 settings=DATE_SETTINGS):
+        self.max_entries = max_entries
+        self.languages = languages
+        self.settings = settings
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # chaîne brute -> datetime ou None
+        self._parser = None
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "fast_path": 0,
+            "dateparser_calls": 0,
+        }
+
+    @property
+    def parser(self):
+        """DateDataParser construit une seule fois (langues et réglages fixes)"""
+        if self._parser is None:
+            from dateparser.date import DateDataParser
+            self._parser = DateDataParser(languages=self.languages, settings=self.settings)
+        return self._parser
+
+    def normalize(self, raw):
+        """Date brute -> datetime (None si non reconnue), avec cache borné"""
+        key = " ".join(raw.split())
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._counters["hits"] += 1
+                return self._cache[key]
+            self._counters["misses"] += 1
+
+        parsed_date = rules.parse_date_fast(key)
+        if parsed_date is not None:
+            counter = "fast_path"
+        else:
+            counter = "dateparser_calls"
+            try:
+                with metrics.stage("dateparser"):
+                    parsed_date = self.parser.get_date_data(key).date_obj
+            except Exception:
+                parsed_date = None
+            if parsed_date == self.settings["RELATIVE_BASE"]:
+                parsed_date = None
+
+        with self._lock:
+            self._counters[counter] += 1
+            self._cache[key] = parsed_date
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return parsed_date
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+            stats["entries"] = len(self._cache)
+            stats["max_entries"] = self.max_entries
+            return stats
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def find_date_candidates(text):
+    """
+    Dates candidates (pattern, début, fin, chaîne brute) de tous les patterns,
+    en un seul parcours (rules.DATE_SCANNER). Les patterns se chevauchent :
+    la même date est souvent trouvée plusieurs fois.
+    """
+    return [(index, match.start(1), match.end(1), match.group(1))
+            for index, match in rules.DATE_SCANNER.scan(text)]
+
+
+def deduplicate_spans(candidates, normalize):
+    """
+    Garder une seule date par zone du texte : la plus longue (puis le pattern
+    le plus prioritaire) qui se normalise ; les candidats qui chevauchent une
+    date retenue sont ignorés sans être parsés. Résultat dans l'ordre des
+    patterns, comme avant la déduplication.
+    """
+    accepted = []
+    for index, start, end, raw in sorted(candidates, key=lambda c: (c[1] - c[2], c[0], c[1])):
+        if any(start < a_end and a_start < end for _, a_start, a_end, _, _ in accepted):
+            continue
+        parsed_date = normalize(raw)
+        if parsed_date is not None:
+            accepted.append((index, start, end, raw, parsed_date))
+
+    accepted.sort(key=lambda c: (c[0], c[1]))
+    return [(raw, parsed_date) for _, _, _, raw, parsed_date in accepted]
+
+
+_normalizer = DateNormalizer()
+
+
+def normalize_date(raw):
+    return _normalizer.normalize(raw)
+
+
+def date_cache_stats():
+    return _normalizer.stats()
@@ -0,0 +1,116 @@
+# ============================================================
+# AdminDoc-X — Export ONNX du modèle LayoutLMv3 fine-tuné
+# python export_onnx.py [--model models/layoutlmv3_trained] [--quantize]
+# ============================================================
+
+import os
+import json
+import argparse
+
+import numpy as np
+import torch
+from PIL import Image
+
+from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3TokenizerFast
+
+from model import MODEL_PATH, ONNX_INPUTS, build_processor
+
+
+class LogitsOnly(torch.nn.Module):
+    """Forward à entrées positionnelles fixes, sortie = logits"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, bbox, pixel_values):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            bbox=bbox,
+            pixel_values=pixel_values,
+        ).logits
+
+
+def sample_encoding(processor, jsonl_path="train_data.jsonl"):
+    """Entrée d'exemple pour le traçage : premier document de train_data.jsonl"""
+    words, boxes = ["AdminDoc-X"], [[0, 0, 100, 20]]
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            item = json.loads(f.readline())
+        words, boxes = item["words"], item["boxes"]
+
+    image = Image.new("RGB", (1000, 1000), "white")
+    return processor(
+        image,
+        words,
+        boxes=boxes,
+        return_tensors="pt",
+        truncation=True,
+    )
+
+
+def export(model_path, output, opset):
+    tokenizer = LayoutLMv3TokenizerFast.from_pretrained(model_path)
+    processor = build_processor(tokenizer, apply_ocr=False)
+    model = LayoutLMv3ForTokenClassification.from_pretrained(model_path).eval()
+
+    encoding = sample_encoding(processor)
+    inputs = tuple(encoding[name] for name in ONNX_INPUTS)
+
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "bbox": {0: "batch", 1: "sequence"},
+        "pixel_values": {0: "batch"},
+        "logits": {0: "batch", 1: "sequence"},
+    }
+
+    torch.onnx.export(
+        LogitsOnly(model),
+        inputs,
+        output,
+        input_names=list(ONNX_INPUTS),
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+    print("✔ Export ONNX →", output)
+
+    # Vérification : mêmes logits (à la tolérance près) que PyTorch
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(output, providers=["CPUExecutionProvider"])
+    onnx_logits = session.run(["logits"], {k: v.numpy() for k, v in zip(ONNX_INPUTS, inputs)})[0]
+    with torch.inference_mode():
+        torch_logits = model(**encoding).logits.numpy()
+
+    print("max |Δ logits| :", float(np.abs(onnx_logits - torch_logits).max()))
+    print("mêmes prédictions :", bool((onnx_logits.argmax(-1) == torch_logits.argmax(-1)).all()))
+
+
+def quantize(onnx_path, output):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(onnx_path, output, weight_type=QuantType.QInt8)
+    print("✔ Export ONNX int8 →", output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export ONNX du modèle LayoutLMv3")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=None, help="défaut : <model>/model.onnx")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--quantize", action="store_true",
+                        help="écrire aussi model.int8.onnx (quantification dynamique)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.model, "model.onnx")
+    export(args.model, output, args.opset)
+
+    if args.quantize:
+        quantize(output, os.path.splitext(output)[0] + ".int8.onnx")
+
+    print("\nUtiliser avec : ADMINDOC_INFERENCE_BACKEND=onnx "
+          "[ADMINDOC_ONNX_MODEL_FILE=model.int8.onnx] python api.py")
@@ -0,0 +1,64 @@
+# image_io.py
+# Chargement des images en mémoire : le pipeline accepte un chemin, des octets
+# (upload HTTP), un tableau numpy ou une image PIL, sans fichier temporaire.
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def load_image(source):
+    """Retourne l'image en tableau numpy BGR (ou niveaux de gris si déjà 2D)"""
+    if isinstance(source, np.ndarray):
+        return source
+
+    if isinstance(source, Image.Image):
+        return cv2.cvtColor(np.array(source.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            # Formats non gérés par OpenCV : essayer avec PIL
+            pil_img = Image.open(io.BytesIO(source)).convert("RGB")
+            img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        return img
+
+    img = cv2.imread(source)
+    if img is None:
+        # Essayer avec PIL si OpenCV échoue
+        pil_img = Image.open(source).convert("RGB")
+        img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+    return img
+
+
+def load_gray(source):
+    """Image en niveaux de gris (tableau numpy 2D)"""
+    img = load_image(source)
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def to_pil_image(source):
+    """Image PIL en mémoire, à passer directement à Tesseract"""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    if isinstance(source, np.ndarray):
+        if source.ndim == 3:
+            return Image.fromarray(cv2.cvtColor(source, cv2.COLOR_BGR2RGB))
+        return Image.fromarray(source)
+    return Image.open(source)
+
+
+def normalize_box(box, width, height):
+    """Boîte (x1, y1, x2, y2) en pixels -> coordonnées 0-1000 (format LayoutLMv3)"""
+    x1, y1, x2, y2 = box
+    return [
+        int(1000 * x1 / width),
+        int(1000 * y1 / height),
+        int(1000 * x2 / width),
+        int(1000 * y2 / height),
+    ]
@@ -0,0 +1,208 @@
+# jobs.py
+# File d'attente de jobs : l'extraction tourne dans un pool de processus
+# borné au lieu du thread de la requête Flask.
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from ocr_llm_extractor import extract_document_info
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("ADMINDOC_JOB_WORKERS", os.cpu_count() or 1))
+JOB_QUEUE_SIZE = int(os.environ.get("ADMINDOC_JOB_QUEUE_SIZE", JOB_WORKERS * 4))
+JOB_RESULT_TTL = float(os.environ.get("ADMINDOC_JOB_RESULT_TTL", 3600))
+JOB_MAX_WAIT = float(os.environ.get("ADMINDOC_JOB_MAX_WAIT", 30))
+
+
+class QueueFullError(Exception):
+    """Levée quand le nombre de jobs en attente atteint la limite"""
+
+
+def run_extraction(source):
+    """Exécutée dans un worker : extraction + horodatage côté worker
+
+    `source` : octets de l'upload (transmis au worker sans passer par le disque).
+    """
+    started_at = time.time()
+    result = extract_document_info(source)
+    return result, started_at, time.time(), os.getpid()
+
+
+# ============================================================
+# JOB
+# ============================================================
+
+class Job:
+
+    def __init__(self, job_id, future, file_id=None):
+        self.id = job_id
+        self.future = future
+        self.file_id = file_id
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.worker_pid = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def status(self):
+        if self.done.is_set():
+            return "failed" if self.error is not None else "done"
+        if self.future.running():
+            return "running"
+        return "queued"
+
+    def timings(self):
+        """Durées en millisecondes (attente dans la file, exécution, total)"""
+        timings = {}
+        if self.started_at is not None:
+            timings["queue_wait_ms"] = round((self.started_at - self.submitted_at) * 1000, 1)
+        if self.finished_at is not None:
+            timings["total_ms"] = round((self.finished_at - self.submitted_at) * 1000, 1)
+            if self.started_at is not None:
+                timings["run_ms"] = round((self.finished_at - self.started_at) * 1000, 1)
+        return timings
+
+    def to_dict(self):
+        info = {
+            "job_id": self.id,
+            "file_id": self.file_id,
+            "status": self.status,
+            "timings": self.timings(),
+        }
+        if self.worker_pid is not None:
+            info["worker_pid"] = self.worker_pid
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+
+# ============================================================
+# QUEUE
+# ============================================================
+
+class JobQueue:
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE,
+                 result_ttl=JOB_RESULT_TTL):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_run_ms = 0.0
+        self._total_wait_ms = 0.0
+
+    def submit(self, fn, *args, file_id=None, callback=None):
+        """Soumettre un job ; QueueFullError si la file est pleine
+
+        `callback(job)` est appelé dans le processus principal quand le job réussit.
+        """
+        with self._lock:
+            self._purge_expired()
+            if self._pending >= self.max_pending:
+                raise QueueFullError(
+                    f"{self._pending} jobs en attente (max {self.max_pending})")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        job = Job(job_id, future, file_id=file_id)
+        with self._lock:
+            self._jobs[job_id] = job
+        future.add_done_callback(lambda f: self._on_done(job, callback))
+        return job
+
+    def _on_done(self, job, callback=None):
+        try:
+            job.result, job.started_at, job.finished_at, job.worker_pid = job.future.result()
+        except Exception as e:
+            job.error = str(e)
+            job.finished_at = time.time()
+
+        timings = job.timings()
+        with self._lock:
+            self._pending -= 1
+            if job.error is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+                self._total_run_ms += timings.get("run_ms", 0.0)
+                self._total_wait_ms += timings.get("queue_wait_ms", 0.0)
+
+        if callback is not None and job.error is None:
+            try:
+                callback(job)
+            except Exception as e:
+                logger.exception("Erreur callback job %s: %s", job.id, e)
+        job.done.set()
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """Long-poll : attendre la fin du job au plus `timeout` secondes"""
+        job = self.get(job_id)
+        if job is not None and timeout > 0:
+            job.done.wait(min(timeout, JOB_MAX_WAIT))
+        return job
+
+    def stats(self):
+        """Compteurs pour dimensionner le pool par rapport au nombre de coeurs"""
+        with self._lock:
+            completed = self._completed
+            return {
+                "workers": self.workers,
+                "cpu_count": os.cpu_count(),
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": completed,
+                "failed": self._failed,
+                "avg_run_ms": round(self._total_run_ms / completed, 1) if completed else None,
+                "avg_queue_wait_ms": round(self._total_wait_ms / completed, 1) if completed else None,
+            }
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """File globale, créée au premier usage (évite de lancer le pool à l'import)"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
@@ -0,0 +1,164 @@
+# metrics.py
+# Chronométrage par étape du pipeline et histogrammes au format Prometheus.
+#
+#   with metrics.collect() as timings:        # une extraction
+#       with metrics.stage("ocr_data"):       # n'importe où en dessous
+#           ...
+#   timings.as_dict()  -> {"ocr_data": 812.4, ...} (ms, renvoyé dans metadata)
+#
+# Les histogrammes vivent dans le processus de l'API : les étapes exécutées
+# dans les workers y sont enregistrées à partir de metadata.timings_ms.
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Bornes des histogrammes (secondes)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current = contextvars.ContextVar("admindoc_timings", default=None)
+
+
+# ============================================================
+# CHRONOMÉTRAGE PAR ÉTAPE
+# ============================================================
+
+class Timings:
+    """Durées cumulées par étape (ms) ; une étape appelée plusieurs fois s'additionne"""
+
+    def __init__(self):
+        self.ms = {}
+
+    def add(self, name, ms):
+        self.ms[name] = self.ms.get(name, 0.0) + ms
+
+    def as_dict(self):
+        return {name: round(ms, 2) for name, ms in self.ms.items()}
+
+
+@contextmanager
+def collect():
+    """Activer la collecte des étapes pour le bloc (et les appels qu'il fait)"""
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Chronométrer une étape ; sans collecte active, ne coûte qu'un perf_counter"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+def record(name, ms):
+    """Ajouter une durée déjà mesurée (ex. temps par étape du prétraitement)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, ms)
+
+
+# ============================================================
+# PROMETHEUS
+# ============================================================
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valeurs des labels -> [comptes par borne, somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = list(zip(self.labelnames, key))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', repr(bound))])} "
+                                 f"{bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines)
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {value}")
+        return "\n".join(lines)
+
+
+STAGE_SECONDS = Histogram(
+    "admindoc_stage_duration_seconds",
+    "Durée de chaque étape du pipeline d'extraction",
+    labelnames=("stage",),
+)
+DOCUMENTS = Counter(
+    "admindoc_documents_total",
+    "Documents traités, par route et par issue",
+    labelnames=("route", "outcome"),
+)
+
+
+def observe_timings(timings_ms):
+    """Enregistrer dans les histogrammes les durées d'un résultat (metadata.timings_ms)"""
+    for name, ms in (timings_ms or {}).items():
+        STAGE_SECONDS.observe(ms / 1000.0, stage=name)
+
+
+def observe_result(result, route):
+    """Compter un résultat d'extraction et enregistrer ses étapes"""
+    if result is None:
+        return
+    DOCUMENTS.inc(route=route, outcome="failed" if "error" in result else "ok")
+    observe_timings(result.get("metadata", {}).get("timings_ms"))
+
+
+def render():
+    """Toutes les métriques au format texte Prometheus (GET /metrics)"""
+    return "\n".join(metric.render() for metric in (STAGE_SECONDS, DOCUMENTS)) + "\n"
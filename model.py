@@ -6,18 +6,21 @@
 import os
 import json
 import cv2
-import torch
 import numpy as np
 from PIL import Image
 import pytesseract
 import re
+import time
+import logging
+import threading
+from collections import OrderedDict
 
-from transformers import (
-    LayoutLMv3ForTokenClassification,
-    LayoutLMv3ImageProcessor,
-    LayoutLMv3TokenizerFast,
-    LayoutLMv3Processor,
-)
+import metrics
+from image_io import load_gray
+from batching import MicroBatcher
+
+# torch, transformers et les poids sont chargés à la première utilisation
+# (voir ModelRegistry) : importer ce module ne coûte presque rien.
 
 # ============================================================
 # CONFIG
@@ -25,44 +28,201 @@ from transformers import (
 
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
-MODEL_PATH = "models/layoutlmv3_trained"
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print("DEVICE:", device)
+logger = logging.getLogger(__name__)
 
-# ============================================================
-# LABELS (auto-loaded from fine-tuned model)
-# ============================================================
+MODEL_PATH = os.environ.get("ADMINDOC_MODEL_PATH", "models/layoutlmv3_trained")
+
+# Nombre de modèles (chemins/versions) gardés en mémoire, éviction LRU
+MAX_RESIDENT_MODELS = int(os.environ.get("ADMINDOC_MAX_MODELS", 1))
+
+# Micro-batching du chemin API : taille max d'un lot et attente max (ms)
+NER_MAX_BATCH_SIZE = int(os.environ.get("ADMINDOC_NER_MAX_BATCH_SIZE", 8))
+NER_MAX_WAIT_MS = float(os.environ.get("ADMINDOC_NER_MAX_WAIT_MS", 10))
+
+# Fenêtres glissantes pour les pages de plus de 512 tokens : tokens repris
+# d'une fenêtre à la suivante (chevauchement)
+NER_MAX_LENGTH = 512
+NER_STRIDE = int(os.environ.get("ADMINDOC_NER_STRIDE", 128))
+# Fenêtres par forward : borne la mémoire d'activation, quel que soit le
+# nombre de documents du lot (une longue page donne plusieurs fenêtres)
+NER_WINDOW_BATCH = int(os.environ.get("ADMINDOC_NER_WINDOW_BATCH", 8))
 
-tokenizer = LayoutLMv3TokenizerFast.from_pretrained(MODEL_PATH)
-image_processor = LayoutLMv3ImageProcessor(apply_ocr=True)
-processor = LayoutLMv3Processor(image_processor, tokenizer)
+# Backend d'inférence :
+#   "torch"      : modèle PyTorch pleine précision
+#   "torch_int8" : quantification dynamique int8 des couches Linear (CPU)
+#   "onnx"       : export ONNX (export_onnx.py) exécuté par onnxruntime
+INFERENCE_BACKENDS = ("torch", "torch_int8", "onnx")
+INFERENCE_BACKEND = os.environ.get("ADMINDOC_INFERENCE_BACKEND", "torch")
+ONNX_MODEL_FILE = os.environ.get("ADMINDOC_ONNX_MODEL_FILE", "model.onnx")
+ONNX_INPUTS = ("input_ids", "attention_mask", "bbox", "pixel_values")
 
-model = LayoutLMv3ForTokenClassification.from_pretrained(MODEL_PATH).to(device)
-id2label = model.config.id2label
+
+def get_device():
+    import torch
+
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
 # ============================================================
-# CLEAN TOKEN FUNCTION
+# MODEL REGISTRY (lazy, thread-safe)
 # ============================================================
 
-def clean_token(token):
-    """
-    Supprime les préfixes: ##, Ġ, spaces, unknown tokens.
-    """
-    token = token.replace("##", "")
-    token = token.replace("Ġ", "")
-    token = token.strip()
-    if token in ["[PAD]", "[CLS]", "[SEP]", "", " ", None]:
-        return None
-    return token
+class LoadedModel:
+    """Tokenizer + processor + modèle fine-tuné d'un même chemin"""
+
+    def __init__(self, path, backend, tokenizer, processor, id2label,
+                 device, model=None, session=None):
+        self.path = path
+        self.backend = backend
+        self.tokenizer = tokenizer
+        self.processor = processor
+        # labels auto-chargés depuis le modèle fine-tuné
+        self.id2label = id2label
+        self.device = device
+        self.model = model
+        self.session = session
+
+    def forward(self, encoding):
+        """Logits (numpy, batch x séquence x labels) quel que soit le backend"""
+        if self.session is not None:
+            feeds = {name: encoding[name].cpu().numpy() for name in ONNX_INPUTS}
+            return self.session.run(["logits"], feeds)[0]
+
+        import torch
+
+        encoding = {k: v.to(self.device) for k, v in encoding.items()}
+        with torch.inference_mode():
+            return self.model(**encoding).logits.float().cpu().numpy()
+
+
+def build_processor(tokenizer, apply_ocr=True):
+    from transformers import LayoutLMv3ImageProcessor, LayoutLMv3Processor
+
+    image_processor = LayoutLMv3ImageProcessor(apply_ocr=apply_ocr)
+    return LayoutLMv3Processor(image_processor, tokenizer)
+
+
+def load_model(path, backend=None):
+    import torch
+    from transformers import (
+        LayoutLMv3Config,
+        LayoutLMv3ForTokenClassification,
+        LayoutLMv3TokenizerFast,
+    )
+
+    backend = backend or INFERENCE_BACKEND
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Backend inconnu: {backend} (attendu: {', '.join(INFERENCE_BACKENDS)})")
+
+    # la quantification dynamique et onnxruntime tournent sur CPU
+    device = get_device() if backend == "torch" else torch.device("cpu")
+    logger.info("Chargement du modèle %s (backend: %s, device: %s)", path, backend, device)
+
+    tokenizer = LayoutLMv3TokenizerFast.from_pretrained(path)
+    processor = build_processor(tokenizer, apply_ocr=True)
+
+    if backend == "onnx":
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(
+            os.path.join(path, ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        id2label = LayoutLMv3Config.from_pretrained(path).id2label
+        return LoadedModel(path, backend, tokenizer, processor, id2label,
+                           device, session=session)
+
+    model = LayoutLMv3ForTokenClassification.from_pretrained(path)
+    model.eval()
+    if backend == "torch_int8":
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.to(device)
+
+    return LoadedModel(path, backend, tokenizer, processor, model.config.id2label,
+                       device, model=model)
+
+
+class ModelRegistry:
+
+    def __init__(self, max_models=MAX_RESIDENT_MODELS, loader=load_model):
+        self.max_models = max_models
+        self.loader = loader
+        self._models = OrderedDict()  # (path, backend) -> LoadedModel
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, path=None, backend=None):
+        """Modèle chargé au premier appel, puis servi depuis la mémoire"""
+        key = (path or MODEL_PATH, backend or INFERENCE_BACKEND)
+
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Un seul chargement par modèle, sans bloquer les autres modèles
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+
+            loaded = self.loader(*key)
+
+            with self._lock:
+                self._models[key] = loaded
+                while len(self._models) > self.max_models:
+                    evicted, _ = self._models.popitem(last=False)
+                    logger.info("Modèle déchargé (LRU): %s", evicted)
+            return loaded
+
+    def warmup(self, path=None, backend=None):
+        """Charger le modèle et exécuter un forward à vide (au démarrage du serveur)"""
+        import torch
+
+        loaded = self.get(path, backend)
+        tokenizer = loaded.tokenizer
+        input_ids = torch.tensor([[tokenizer.cls_token_id, tokenizer.sep_token_id]])
+        loaded.forward({
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "bbox": torch.zeros((1, 2, 4), dtype=torch.long),
+            "pixel_values": torch.zeros((1, 3, 224, 224)),
+        })
+        return loaded
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    def unload(self, path=None, backend=None):
+        with self._lock:
+            self._models.pop((path or MODEL_PATH, backend or INFERENCE_BACKEND), None)
+
+
+registry = ModelRegistry()
+
+
+def get_model(path=None, backend=None):
+    return registry.get(path, backend)
+
+
+def warmup(path=None, backend=None):
+    return registry.warmup(path, backend)
 
 
 # ============================================================
 # IMAGE PREPROCESSING
 # ============================================================
 
-def preprocess_image(img_path):
-    img = cv2.imread(img_path, 0)
+def preprocess_image(source):
+    """Retourne l'image nettoyée en mémoire (plus de fichier temp_clean.png partagé)"""
+    img = load_gray(source)
 
     # amélioration OCR
     img = cv2.adaptiveThreshold(
@@ -73,69 +233,231 @@ def preprocess_image(img_path):
     )
     img = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
 
-    temp_path = "temp_clean.png"
-    cv2.imwrite(temp_path, img)
-    return temp_path
+    return Image.fromarray(img)
 
 
 # ============================================================
-# ENTITY EXTRACTION
+# BIO DECODING
 # ============================================================
 
-def extract_entities(img_path):
+def softmax(logits):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
 
-    img_clean = preprocess_image(img_path)
-    image = Image.open(img_clean).convert("RGB")
 
-    encoding = processor(
-        image,
+def label_tables(id2label):
+    """
+    Par id de label : index du type d'entité (-1 pour O) et indicateur B-,
+    plus la liste des types (ex. "B-DATE"/"I-DATE" -> type "DATE").
+    """
+    labels = [id2label[i] for i in range(len(id2label))]
+    types = sorted({label[2:] for label in labels if label[:2] in ("B-", "I-")})
+    type_of = np.array([types.index(label[2:]) if label[:2] in ("B-", "I-") else -1
+                        for label in labels])
+    is_begin = np.array([label.startswith("B-") for label in labels])
+    return type_of, is_begin, types
+
+
+def decode_entities(words, word_logits, id2label, valid=None):
+    """
+    Regrouper les mots en entités (logique BIO), sans boucle sur les mots :
+    label = argmax des logits par mot, confiance = probabilité softmax.
+    Un span commence sur B-X, ou sur I-X qui ne suit pas un mot de type X.
+    Retourne tous les spans de chaque type avec leur score (confiance moyenne).
+    `valid` : masque des mots à considérer (les autres comptent comme O).
+    """
+    type_of, is_begin, types = label_tables(id2label)
+    entities = {}
+
+    if len(words):
+        probs = softmax(np.asarray(word_logits, dtype=np.float32))
+        predictions = probs.argmax(axis=-1)
+        confidence = probs.max(axis=-1)
+
+        word_types = type_of[predictions]
+        if valid is not None:
+            word_types = np.where(valid, word_types, -1)
+        previous = np.concatenate(([-1], word_types[:-1]))
+
+        in_span = word_types >= 0
+        starts = in_span & (is_begin[predictions] | (word_types != previous))
+
+        # spans = suites contiguës de mots d'entité, découpées à chaque début
+        span_words = np.flatnonzero(in_span)
+        first = np.flatnonzero(starts[span_words])
+        if first.size:
+            span_starts = span_words[first]
+            lengths = np.diff(np.append(first, span_words.size))
+            scores = np.add.reduceat(confidence[span_words], first) / lengths
+
+            for begin, length, score in zip(span_starts.tolist(), lengths.tolist(), scores.tolist()):
+                entities.setdefault(types[word_types[begin]], []).append({
+                    "text": " ".join(words[begin:begin + length]),
+                    "score": round(score, 4),
+                    "start": begin,
+                    "end": begin + length,
+                })
+
+    # CLASSIFY DOC TYPE (default)
+    entities["DOC_TYPE"] = "autre"
+
+    return entities
+
+
+# ============================================================
+# ENTITY EXTRACTION
+# ============================================================
+
+def encode_windows(loaded, words, boxes, pixel_values, stride=NER_STRIDE):
+    """
+    Tokeniser chaque document en fenêtres de NER_MAX_LENGTH tokens qui se
+    chevauchent de `stride` tokens (une seule fenêtre si le document tient).
+    Retourne (encoding, index du document de chaque fenêtre).
+    """
+    encoding = loaded.tokenizer(
+        words,
+        boxes=boxes,
+        truncation=True,
+        max_length=NER_MAX_LENGTH,
+        stride=stride,
+        return_overflowing_tokens=True,
+        padding="longest",
         return_tensors="pt",
-        padding="max_length",
-        truncation=True
     )
+    sample_map = encoding.pop("overflow_to_sample_mapping")
+    encoding["pixel_values"] = pixel_values[sample_map]
+    return encoding, sample_map.numpy()
 
-    encoding = {k: v.to(device) for k, v in encoding.items()}
 
-    with torch.no_grad():
-        outputs = model(**encoding)
+def forward_windows(loaded, encoding, batch_size):
+    """Logits de toutes les fenêtres, par lots de `batch_size` fenêtres"""
+    windows = len(encoding["input_ids"])
+    logits = [
+        loaded.forward({name: encoding[name][start:start + batch_size] for name in ONNX_INPUTS})
+        for start in range(0, windows, batch_size)
+    ]
+    return np.concatenate(logits, axis=0)
 
-    logits = outputs.logits
-    predictions = torch.argmax(logits, dim=-1)[0].cpu().tolist()
-    tokens = tokenizer.convert_ids_to_tokens(encoding["input_ids"][0])
 
-    entities = {}
-    current_label = None
-    buffer = []
+def merge_window_logits(encoding, sample_map, logits, num_words):
+    """
+    Logits par mot : premier sous-mot de chaque mot, moyenné sur les fenêtres
+    qui contiennent ce mot. Retourne une liste (un tableau mots x labels par
+    document) et le nombre de fenêtres ayant vu chaque mot.
+    """
+    offsets = np.concatenate(([0], np.cumsum(num_words)))
+    sums = np.zeros((offsets[-1], logits.shape[-1]), dtype=np.float32)
+    counts = np.zeros(offsets[-1], dtype=np.int32)
 
-    # =============== Extract entities with BIO logic ===============
-    for token, pred in zip(tokens, predictions):
+    for window, doc in enumerate(sample_map):
+        word_ids = np.array([-1 if w is None else w for w in encoding.word_ids(window)])
+        previous = np.concatenate(([-1], word_ids[:-1]))
+        positions = np.flatnonzero((word_ids >= 0) & (word_ids != previous))
+        rows = offsets[doc] + word_ids[positions]
+        np.add.at(sums, rows, logits[window, positions])
+        np.add.at(counts, rows, 1)
+
+    averaged = sums / np.maximum(counts, 1)[:, None]
+    return ([averaged[offsets[d]:offsets[d + 1]] for d in range(len(num_words))],
+            [counts[offsets[d]:offsets[d + 1]] for d in range(len(num_words))])
 
-        token = clean_token(token)
-        if token is None:
-            continue
 
-        label = id2label[pred]
+def split_source(item):
+    """
+    (image, mots, boîtes) d'une entrée : une image seule, ou un dict
+    {"image", "words", "boxes"} qui apporte l'OCR déjà fait (boîtes 0-1000,
+    voir ocr_llm_extractor.layout_from_ocr_data).
+    """
+    if isinstance(item, dict):
+        return item["image"], item.get("words"), item.get("boxes")
+    return item, None, None
 
-        if label.startswith("B-"):
-            # save previous entity
-            if current_label and buffer:
-                entities[current_label] = " ".join(buffer)
 
-            current_label = label[2:]  # remove B-
-            buffer = [token]
+def page_features(loaded, items):
+    """
+    Mots, boîtes et pixels des documents d'un lot. Le processor d'images ne
+    lance Tesseract que pour les documents arrivés sans OCR.
+    """
+    import torch
 
-        elif label.startswith("I-") and current_label == label[2:]:
-            buffer.append(token)
+    sources = [split_source(item) for item in items]
+    images = [preprocess_image(image).convert("RGB") for image, _, _ in sources]
+    words = [w for _, w, _ in sources]
+    boxes = [b for _, _, b in sources]
+    pixel_values = [None] * len(images)
 
-        else:
-            # O label
+    for apply_ocr in (False, True):
+        indices = [i for i, w in enumerate(words) if (w is None) == apply_ocr]
+        if not indices:
             continue
+        features = loaded.processor.image_processor(
+            [images[i] for i in indices], apply_ocr=apply_ocr, return_tensors="pt")
+        for j, i in enumerate(indices):
+            pixel_values[i] = features["pixel_values"][j]
+            if apply_ocr:
+                words[i], boxes[i] = features["words"][j], features["boxes"][j]
 
-    # save last entity
-    if current_label and buffer:
-        entities[current_label] = " ".join(buffer)
+    return words, boxes, torch.stack(pixel_values)
 
-    # CLASSIFY DOC TYPE (default)
-    entities["DOC_TYPE"] = "autre"
 
-    return entities
+def extract_entities_batch(sources, batch_size=NER_MAX_BATCH_SIZE, model_path=None,
+                           window_batch_size=NER_WINDOW_BATCH):
+    """
+    NER sur plusieurs documents. Les pages trop longues pour 512 tokens sont
+    découpées en fenêtres glissantes ; toutes les fenêtres passent par lots
+    dans le modèle et les prédictions sont fusionnées au niveau des mots.
+    `sources` : images, ou dicts {"image", "words", "boxes"} pour réutiliser
+    l'OCR de l'extracteur au lieu d'un second passage Tesseract.
+    `batch_size` : documents par lot de caractéristiques ;
+    `window_batch_size` : fenêtres par forward du modèle.
+    """
+    loaded = get_model(model_path)
+    results = []
+
+    for start in range(0, len(sources), batch_size):
+        words, boxes, pixel_values = page_features(loaded, sources[start:start + batch_size])
+
+        # le NER tourne par lots dans le processus de l'API : durées par lot
+        # enregistrées directement dans les histogrammes de /metrics
+        t0 = time.perf_counter()
+        encoding, sample_map = encode_windows(loaded, words, boxes, pixel_values)
+        logits = forward_windows(loaded, encoding, window_batch_size)
+        t1 = time.perf_counter()
+        word_logits, word_counts = merge_window_logits(encoding, sample_map, logits,
+                                                       [len(w) for w in words])
+
+        for doc_words, doc_logits, counts in zip(words, word_logits, word_counts):
+            # un mot sans aucun token (chaîne vide après tokenisation) compte comme O
+            results.append(decode_entities(doc_words, doc_logits, loaded.id2label,
+                                           valid=counts > 0))
+        t2 = time.perf_counter()
+        metrics.STAGE_SECONDS.observe(t1 - t0, stage="ner_forward")
+        metrics.STAGE_SECONDS.observe(t2 - t1, stage="ner_decode")
+
+    return results
+
+
+def extract_entities(source, model_path=None):
+    return extract_entities_batch([source], model_path=model_path)[0]
+
+
+# ============================================================
+# MICRO-BATCHING (API)
+# ============================================================
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_path=None):
+    """Collecteur partagé (un par modèle) : les requêtes concurrentes partagent un forward"""
+    model_path = model_path or MODEL_PATH
+    with _batchers_lock:
+        if model_path not in _batchers:
+            _batchers[model_path] = MicroBatcher(
+                lambda sources: extract_entities_batch(sources, model_path=model_path),
+                max_batch_size=NER_MAX_BATCH_SIZE,
+                max_wait_ms=NER_MAX_WAIT_MS,
+            )
+        return _batchers[model_path]
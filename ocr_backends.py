@@ -0,0 +1,265 @@
+# ocr_backends.py
+# Moteurs OCR interchangeables derrière run_ocr :
+#   "pytesseract" : un processus `tesseract` par appel (fichier temporaire,
+#                   chargement des traineddata à chaque fois)
+#   "tesserocr"   : pool borné de moteurs Tesseract (API C) gardés en mémoire,
+#                   langues chargées une seule fois par moteur et par processus
+# Les deux retournent les mêmes structures que pytesseract (Output.DICT).
+import os
+import re
+import queue
+import threading
+from contextlib import contextmanager
+
+import pytesseract
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+OCR_BACKENDS = ("pytesseract", "tesserocr")
+OCR_BACKEND = os.environ.get("ADMINDOC_OCR_BACKEND", "pytesseract")
+# Moteurs tesserocr par processus et par langue
+OCR_ENGINE_POOL_SIZE = int(os.environ.get("ADMINDOC_OCR_ENGINES", 2))
+# Dossier tessdata (défaut de la bibliothèque si non défini)
+TESSDATA_PATH = os.environ.get("TESSDATA_PREFIX")
+
+# Colonnes de pytesseract.image_to_data(output_type=Output.DICT)
+DATA_KEYS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+             "left", "top", "width", "height", "conf", "text")
+
+
+def parse_tesseract_config(config):
+    """(psm, oem) depuis une config en ligne de commande ('--oem 3 --psm 3')"""
+    psm = re.search(r"--psm\s+(\d+)", config or "")
+    oem = re.search(r"--oem\s+(\d+)", config or "")
+    return (int(psm.group(1)) if psm else 3,
+            int(oem.group(1)) if oem else 3)
+
+
+def text_from_ocr_data(data, page_separator="\f"):
+    """Reconstruire le texte brut depuis la sortie de image_to_data
+
+    Même mise en forme que image_to_string : mots séparés par un espace,
+    une ligne par ligne OCR, une ligne vide après chaque paragraphe.
+    """
+    paragraphs = []
+    current_par = None
+    current_line = None
+
+    for i, word in enumerate(data["text"]):
+        if data["level"][i] != 5 or not word.strip():
+            continue
+
+        par_key = (data["page_num"][i], data["block_num"][i], data["par_num"][i])
+        line_key = par_key + (data["line_num"][i],)
+
+        if par_key != current_par:
+            paragraphs.append([])
+            current_par = par_key
+            current_line = None
+        if line_key != current_line:
+            paragraphs[-1].append([])
+            current_line = line_key
+
+        paragraphs[-1][-1].append(word)
+
+    text = "".join(
+        "".join(" ".join(line) + "\n" for line in par) + "\n"
+        for par in paragraphs
+    )
+    return text + page_separator
+
+
+# ============================================================
+# PYTESSERACT (un processus par appel)
+# ============================================================
+
+class PytesseractBackend:
+    name = "pytesseract"
+
+    def image_to_string(self, pil_image, lang, config):
+        return pytesseract.image_to_string(pil_image, lang=lang, config=config)
+
+    def image_to_data(self, pil_image, lang, config):
+        return pytesseract.image_to_data(pil_image, lang=lang, config=config,
+                                         output_type=pytesseract.Output.DICT)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+# ============================================================
+# TESSEROCR (moteurs persistants)
+# ============================================================
+
+class EnginePool:
+    """Au plus `size` moteurs pour une (langue, psm, oem), créés à la demande"""
+
+    def __init__(self, lang, psm, oem, size=OCR_ENGINE_POOL_SIZE):
+        self.lang = lang
+        self.psm = psm
+        self.oem = oem
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._uses = 0
+
+    def _create(self):
+        from tesserocr import PyTessBaseAPI
+
+        kwargs = {"lang": self.lang, "psm": self.psm, "oem": self.oem}
+        if TESSDATA_PATH:
+            kwargs["path"] = TESSDATA_PATH
+        return PyTessBaseAPI(**kwargs)
+
+    @contextmanager
+    def engine(self):
+        """Emprunter un moteur (attend qu'un moteur se libère si le pool est plein)"""
+        try:
+            api = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    api = self._create()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                api = self._idle.get()
+
+        try:
+            yield api
+        finally:
+            api.Clear()
+            with self._lock:
+                self._uses += 1
+            self._idle.put(api)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+    def stats(self):
+        with self._lock:
+            return {"lang": self.lang, "engines": self._created,
+                    "idle": self._idle.qsize(), "uses": self._uses}
+
+
+def _words_to_dict(api, size):
+    """Résultat reconnu -> même dict que pytesseract.image_to_data (Output.DICT)"""
+    from tesserocr import RIL
+
+    data = {key: [] for key in DATA_KEYS}
+
+    def append(level, nums, box, conf=-1, text=""):
+        x1, y1, x2, y2 = box or (0, 0, 0, 0)
+        row = (level, 1) + nums + (x1, y1, x2 - x1, y2 - y1, conf, text)
+        for key, value in zip(DATA_KEYS, row):
+            data[key].append(value)
+
+    append(1, (0, 0, 0, 0), (0, 0) + size)
+
+    iterator = api.GetIterator()
+    if iterator is None:
+        return data
+
+    block = par = line = word = 0
+    levels = ((RIL.BLOCK, 2), (RIL.PARA, 3), (RIL.TEXTLINE, 4))
+    while True:
+        if not iterator.Empty(RIL.WORD):
+            if iterator.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line, word = block + 1, 0, 0, 0
+            if iterator.IsAtBeginningOf(RIL.PARA):
+                par, line, word = par + 1, 0, 0
+            if iterator.IsAtBeginningOf(RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+
+            for ril, level in levels:
+                if iterator.IsAtBeginningOf(ril):
+                    nums = (block, par if level > 2 else 0, line if level > 3 else 0, 0)
+                    append(level, nums, iterator.BoundingBox(ril))
+
+            append(5, (block, par, line, word), iterator.BoundingBox(RIL.WORD),
+                   round(iterator.Confidence(RIL.WORD), 2),
+                   iterator.GetUTF8Text(RIL.WORD) or "")
+        if not iterator.Next(RIL.WORD):
+            break
+
+    return data
+
+
+class TesserocrBackend:
+    name = "tesserocr"
+
+    def __init__(self, pool_size=OCR_ENGINE_POOL_SIZE):
+        self.pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pool(self, lang, config):
+        psm, oem = parse_tesseract_config(config)
+        key = (lang, psm, oem)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = EnginePool(lang, psm, oem, size=self.pool_size)
+            return self._pools[key]
+
+    def image_to_string(self, pil_image, lang, config):
+        with self.pool(lang, config).engine() as api:
+            api.SetImage(pil_image)
+            # le CLI (pytesseract) termine chaque page par un saut de page
+            return api.GetUTF8Text() + "\f"
+
+    def image_to_data(self, pil_image, lang, config):
+        with self.pool(lang, config).engine() as api:
+            api.SetImage(pil_image)
+            api.Recognize()
+            return _words_to_dict(api, pil_image.size)
+
+    def warmup(self, lang, config):
+        """Créer un moteur (chargement des traineddata) avant la première requête"""
+        with self.pool(lang, config).engine():
+            pass
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+    def stats(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        return {"backend": self.name, "pools": [p.stats() for p in pools]}
+
+
+# ============================================================
+# SÉLECTION
+# ============================================================
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """Moteur OCR du processus (un seul par nom, créé au premier appel)"""
+    name = name or OCR_BACKEND
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Moteur OCR inconnu: {name} (attendu: {', '.join(OCR_BACKENDS)})")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = TesserocrBackend() if name == "tesserocr" else PytesseractBackend()
+        return _backends[name]
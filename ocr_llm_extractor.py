@@ -1,62 +1,176 @@
 # ocr_llm_extractor.py
+import os
+import time
+import logging
 import pytesseract
 from PIL import Image
-import json
-import re
-import cv2
 import numpy as np
 from datetime import datetime
-import dateparser
+
+from image_io import load_gray, to_pil_image, normalize_box
+from ocr_backends import text_from_ocr_data
+import metrics
+import ocr_backends
+import preprocessing
+import templates
+import classify
+import regions
+import rules
+import date_normalizer
+
+logger = logging.getLogger(__name__)
 
 # Path to Tesseract
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
-def preprocess_image_for_ocr(img_path):
-    """Prétraitement de l'image pour améliorer l'OCR"""
+# Version du pipeline : à incrémenter quand le prétraitement ou les règles
+# changent le résultat (invalide le cache des résultats)
+PIPELINE_VERSION = "14"
+
+# Configuration OCR avancée
+OCR_LANG = 'fra+eng'
+OCR_CONFIG = r'--oem 3 --psm 3'
+
+# "single" : un seul passage image_to_data, texte reconstruit depuis ses lignes
+# "double" : image_to_string puis image_to_data (ancien comportement)
+# "regions" : grandes pages découpées en régions OCRisées en parallèle
+#             (voir regions.py) ; "single" pour les petites pages
+OCR_MODES = ("single", "double", "regions")
+OCR_MODE = os.environ.get("ADMINDOC_OCR_MODE", "single")
+
+
+def pipeline_config():
+    """Paramètres qui influencent le résultat d'extraction (clé du cache)"""
+    return {
+        "version": PIPELINE_VERSION,
+        "lang": OCR_LANG,
+        "ocr_config": OCR_CONFIG,
+        "ocr_mode": OCR_MODE,
+        "ocr_backend": ocr_backends.OCR_BACKEND,
+        "region_min_pixels": regions.REGION_MIN_PIXELS if OCR_MODE == "regions" else None,
+        "preprocess_profile": preprocessing.PREPROCESS_PROFILE,
+        "auto_noise_sigma": preprocessing.AUTO_NOISE_SIGMA,
+        # ajouter ou modifier un modèle de formulaire invalide le cache
+        "templates": templates.get_registry().version if templates.TEMPLATES_ENABLED else None,
+        "keywords": rules.KEYWORDS_VERSION,
+        "date_relative_base": date_normalizer.DATE_RELATIVE_BASE.isoformat(),
+        "classify": {
+            "header_fraction": classify.CLASSIFY_HEADER_FRACTION,
+            "width": classify.CLASSIFY_WIDTH,
+            "header_only_types": sorted(classify.HEADER_ONLY_TYPES),
+        } if classify.CLASSIFY_ENABLED else None,
+    }
+
+def preprocess_image_for_ocr(source, profile=None, info=None, deskew=True):
+    """Prétraitement de l'image pour améliorer l'OCR
+
+    `source` : chemin, octets du fichier, tableau numpy ou image PIL.
+    `profile` : "auto", "fast", "quality" ou "none" (voir preprocessing.py).
+    `info` : dict optionnel rempli avec le profil retenu et le temps par étape.
+    `deskew` : False pour garder la géométrie de la page décodée.
+    """
+    info = {} if info is None else info
     try:
-        # Charger l'image
-        img = cv2.imread(img_path)
-        if img is None:
-            # Essayer avec PIL si OpenCV échoue
-            pil_img = Image.open(img_path)
-            img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-        
-        # Convertir en niveaux de gris
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Débruitage
-        denoised = cv2.fastNlMeansDenoising(gray, None, 30, 7, 21)
-        
-        # Amélioration du contraste (CLAHE)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced = clahe.apply(denoised)
-        
-        # Binarisation adaptative
-        binary = cv2.adaptiveThreshold(enhanced, 255, 
-                                     cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                     cv2.THRESH_BINARY, 11, 2)
-        
-        # Redimensionner si trop petit
-        height, width = binary.shape
-        if height < 500 or width < 500:
-            scale = 2
-            new_height, new_width = int(height * scale), int(width * scale)
-            resized = cv2.resize(binary, (new_width, new_height), 
-                               interpolation=cv2.INTER_CUBIC)
-        else:
-            resized = binary
-        
-        return resized
+        processed = preprocessing.preprocess(source, profile=profile, info=info, deskew=deskew)
+        timings = dict(info.get("timings_ms", {}))
+        metrics.record("decode", timings.pop("decode", 0.0))
+        metrics.record("preprocess", sum(timings.values()))
+        return processed
     except Exception as e:
-        print(f"Erreur prétraitement: {e}")
+        logger.warning("Erreur prétraitement: %s", e)
         # Retourner l'image originale en cas d'erreur
-        return Image.open(img_path).convert('L')
+        return to_pil_image(source).convert('L')
+
+def _ocr_region(crop, x0, y0, lang):
+    """OCR d'une région (exécuté dans le pool de regions.py)"""
+    data = ocr_backends.get_backend().image_to_data(Image.fromarray(crop), lang, OCR_CONFIG)
+    return data, x0, y0
+
+
+def run_ocr_regions(img, lang=OCR_LANG):
+    """
+    OCR parallèle par régions d'une image binarisée (numpy 2D).
+    Retourne (texte, données) au même format qu'un passage sur la page
+    entière, ou None si la page ne se découpe pas en plusieurs régions.
+    """
+    boxes = regions.find_regions(img)
+    if len(boxes) < 2:
+        return None
 
-def extract_text_with_layout(img_path, lang='fra+eng'):
-    """OCR avec détection de mise en page"""
+    pool = regions.get_region_pool()
+    futures = [pool.submit(_ocr_region, *regions.crop_region(img, box), lang)
+               for box in boxes]
+    data = regions.merge_region_data([f.result() for f in futures],
+                                     (img.shape[1], img.shape[0]))
+    return text_from_ocr_data(data), data
+
+
+def layout_from_ocr_data(data):
+    """
+    Mots et boîtes normalisées 0-1000 (format LayoutLMv3, comme
+    prepare_dataset) depuis image_to_data : entrée du modèle NER sans
+    second passage OCR.
+    """
+    width = height = None
+    words, boxes = [], []
+    for i, level in enumerate(data["level"]):
+        if level == 1 and width is None:
+            width, height = data["width"][i], data["height"][i]
+        elif level == 5 and data["text"][i].strip():
+            left, top = data["left"][i], data["top"][i]
+            words.append(data["text"][i].strip())
+            boxes.append([left, top, left + data["width"][i], top + data["height"][i]])
+
+    if not width or not height:
+        return {"words": [], "boxes": []}
+    boxes = [[min(1000, max(0, v)) for v in normalize_box(box, width, height)] for box in boxes]
+    return {"words": words, "boxes": boxes}
+
+
+def run_ocr(pil_image, lang=OCR_LANG, mode=None):
+    """OCR d'une image déjà prétraitée ; retourne (texte, données image_to_data)"""
+    mode = mode or OCR_MODE
+    if mode not in OCR_MODES:
+        raise ValueError(f"Mode OCR inconnu: {mode} (attendu: {', '.join(OCR_MODES)})")
+
+    if mode == "regions":
+        if (pil_image.width * pil_image.height >= regions.REGION_MIN_PIXELS
+                and regions.pool_available()):
+            with metrics.stage("ocr_data"):
+                result = run_ocr_regions(np.array(pil_image.convert("L")), lang=lang)
+            if result is not None:
+                return result
+        mode = "single"
+
+    backend = ocr_backends.get_backend()
+
+    if mode == "double":
+        # Extraire le texte avec mise en page
+        with metrics.stage("ocr_string"):
+            text = backend.image_to_string(pil_image, lang, OCR_CONFIG)
+
+    # Extraire aussi les données avec structure
+    with metrics.stage("ocr_data"):
+        data = backend.image_to_data(pil_image, lang, OCR_CONFIG)
+
+    if mode == "single":
+        # Un seul passage du moteur : le texte est reconstruit depuis les données
+        text = text_from_ocr_data(data)
+
+    return text, data
+
+
+def extract_text_with_layout(source, lang=OCR_LANG, mode=None, profile=None, info=None,
+                             processed=None):
+    """OCR avec détection de mise en page
+
+    `processed` : image déjà prétraitée (évite de refaire le prétraitement).
+    """
     try:
         # Prétraitement
-        processed_img = preprocess_image_for_ocr(img_path)
+        if processed is None:
+            processed = preprocess_image_for_ocr(source, profile=profile, info=info)
+        processed_img = processed
         
         # Convertir en image PIL pour pytesseract
         if isinstance(processed_img, np.ndarray):
@@ -64,71 +178,47 @@ def extract_text_with_layout(img_path, lang='fra+eng'):
         else:
             pil_image = processed_img
         
-        # Configuration OCR avancée
-        custom_config = r'--oem 3 --psm 3'
-        
-        # Extraire le texte avec mise en page
-        text = pytesseract.image_to_string(pil_image, lang=lang, config=custom_config)
-        
-        # Extraire aussi les données avec structure
-        data = pytesseract.image_to_data(pil_image, lang=lang, config=custom_config, 
-                                        output_type=pytesseract.Output.DICT)
-        
-        return text, data
+        return run_ocr(pil_image, lang=lang, mode=mode)
     except Exception as e:
-        print(f"Erreur OCR: {e}")
+        logger.warning("Erreur OCR: %s", e)
         # Fallback simple
-        img = Image.open(img_path)
-        text = pytesseract.image_to_string(img, lang=lang)
+        img = to_pil_image(source)
+        with metrics.stage("ocr_string"):
+            text = pytesseract.image_to_string(img, lang=lang)
         return text, None
 
-def find_document_type(text):
+def find_document_type(text, hits=None):
     """Détecter le type de document"""
-    text_lower = text.lower()
-    
-    if any(word in text_lower for word in ['unesco', 'memoire du monde', 'organisation des nations unies']):
-        return "certificat_unesco"
-    elif any(word in text_lower for word in ['archives nationales', 'présidence du gouvernement', 'république tunisienne']):
-        return "document_administratif_tunisien"
-    elif any(word in text_lower for word in ['horaires', 'horaire', 'ouverture', 'salle de lecture']):
-        return "horaire_ouverture"
-    elif any(word in text_lower for word in ['inscription', 'certificat', 'registration']):
-        return "certificat"
-    else:
-        return "document_generique"
+    if hits is None:
+        hits = rules.keyword_hits(text)
+    return rules.match_document_type(hits)
+
+def normalize_date(raw):
+    """Date brute -> datetime : chemin rapide, sinon dateparser (mémoïsé)"""
+    return date_normalizer.normalize_date(raw)
 
 def extract_date_advanced(text):
     """Extraction avancée des dates"""
     dates_found = []
     
-    # Patterns de dates
-    date_patterns = [
-        r'(\d{1,2}\s+(?:janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre)\s+\d{4})',
-        r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
-        r'(\d{1,2}\s+[A-Za-zÀ-ÿ]+\s+\d{4})',
-        r'le\s+(\d{1,2}\s+[A-Za-zÀ-ÿ]+\s+\d{4})',
-        r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
-    ]
-    
-    for pattern in date_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
-            try:
-                # Essayer de parser la date
-                parsed_date = dateparser.parse(match, languages=['fr', 'en'])
-                if parsed_date:
-                    dates_found.append({
-                        'raw': match,
-                        'parsed': parsed_date.strftime('%Y-%m-%d'),
-                        'iso': parsed_date.isoformat()
-                    })
-            except:
-                continue
+    # Une date trouvée par plusieurs patterns n'est parsée et renvoyée qu'une fois
+    candidates = date_normalizer.find_date_candidates(text)
+    for raw, parsed_date in date_normalizer.deduplicate_spans(candidates, normalize_date):
+        dates_found.append({
+            'raw': raw,
+            'parsed': parsed_date.strftime('%Y-%m-%d'),
+            'iso': parsed_date.isoformat()
+        })
     
     return dates_found
 
-def extract_entities_structured(text, data_dict=None):
-    """Extraction structurée des entités"""
+def extract_entities_structured(text, data_dict=None, document_type=None, rule_groups=None):
+    """Extraction structurée des entités
+
+    `document_type` : type déjà connu (classification de l'en-tête).
+    `rule_groups` : groupes de rules.RULE_GROUPS à appliquer (None = tous).
+    """
+    wanted = set(rule_groups or rules.RULE_GROUPS)
     entities = {
         "document_type": None,
         "title": None,
@@ -145,102 +235,58 @@ def extract_entities_structured(text, data_dict=None):
         "urls": []
     }
     
+    # Un seul parcours du texte pour tous les mots-clés (types, organisations,
+    # exclusions de titre), avec leurs positions
+    hits = rules.keyword_hits(text)
+    
     # 1. Type de document
-    entities["document_type"] = find_document_type(text)
+    entities["document_type"] = document_type or find_document_type(text, hits)
     
     # 2. Titre (premières lignes significatives)
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    if len(lines) > 0:
-        # Prendre les premières lignes non-vides comme titre potentiel
-        title_candidates = []
-        for line in lines[:5]:  # Regarder les 5 premières lignes
-            if len(line) > 10 and not any(word in line.lower() for word in 
-                                         ['date', 'n°', 'numéro', 'téléphone', 'email', 'www']):
-                title_candidates.append(line)
-        
-        if title_candidates:
-            entities["title"] = title_candidates[0]
+    if "title" in wanted:
+        # Prendre la première des 5 premières lignes non-vides qui ressemble à un titre
+        entities["title"] = rules.find_title(text, hits)
     
     # 3. Numéro de référence
-    ref_patterns = [
-        r'N[°ºo]\s*[:]?\s*([A-Z0-9\-/]+)',
-        r'Ref[ée]rence\s*[:]?\s*([A-Z0-9\-/]+)',
-        r'Num[ée]ro\s*[:]?\s*([A-Z0-9\-/]+)',
-        r'ID\s*[:]?\s*([A-Z0-9\-/]+)'
-    ]
-    
-    for pattern in ref_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            entities["reference_number"] = match.group(1).strip()
-            break
+    if "reference_number" in wanted:
+        reference = rules.first_group(rules.REFERENCE_RES, text)
+        if reference:
+            entities["reference_number"] = reference.strip()
     
     # 4. Dates
-    entities["dates"] = extract_date_advanced(text)
-    if entities["dates"]:
-        entities["date"] = entities["dates"][0]['parsed']  # Première date trouvée
+    if "dates" in wanted:
+        entities["dates"] = extract_date_advanced(text)
+        if entities["dates"]:
+            entities["date"] = entities["dates"][0]['parsed']  # Première date trouvée
     
     # 5. Organisation
-    org_keywords = ['UNESCO', 'Archives Nationales', 'Présidence du gouvernement', 
-                   'République Tunisienne', 'Organisation des Nations Unies']
-    
-    for keyword in org_keywords:
-        if keyword.lower() in text.lower():
-            entities["organization"] = keyword
-            break
+    if "organization" in wanted:
+        entities["organization"] = rules.match_organization(hits)
     
     # 6. Localisation (ville, pays)
-    location_patterns = [
-        r'à\s+([A-Za-zÀ-ÿ]+)',
-        r'([A-Za-zÀ-ÿ]+)\s+Tunisie',
-        r'Tunis\s+([A-Za-zÀ-ÿ]+)'
-    ]
-    
-    for pattern in location_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            entities["location"] = matches[0]
-            break
+    if "location" in wanted:
+        entities["location"] = rules.first_group(rules.LOCATION_RES, text)
     
     # 7. Informations de contact
-    # Numéros de téléphone
-    phone_matches = re.findall(r'\(?\d{2,4}\)?[\s\-]?\d{2,3}[\s\-]?\d{2,3}[\s\-]?\d{2,3}', text)
-    entities["phone_numbers"] = phone_matches
-    
-    # Emails
-    email_matches = re.findall(r'[\w\.-]+@[\w\.-]+\.\w+', text)
-    entities["emails"] = email_matches
-    
-    # URLs
-    url_matches = re.findall(r'www\.\S+|\bhttps?://\S+', text)
-    entities["urls"] = url_matches
-    
-    # 8. Adresses
-    address_patterns = [
-        r'\d+,\s+[A-Za-zÀ-ÿ\s\d]+,\s+\d+\s+[A-Za-zÀ-ÿ]+',
-        r'[A-Za-zÀ-ÿ\s]+,\s+\d+\s+[A-Za-zÀ-ÿ]+',
-        r'\d+\s+[A-Za-zÀ-ÿ\s]+\s+\d{4,5}\s+[A-Za-zÀ-ÿ]+'
-    ]
-    
-    for pattern in address_patterns:
-        matches = re.findall(pattern, text)
-        if matches:
-            entities["addresses"].extend(matches)
+    if "contacts" in wanted:
+        # Numéros de téléphone
+        entities["phone_numbers"] = rules.PHONE_RE.findall(text)
+        
+        # Emails
+        entities["emails"] = rules.EMAIL_RE.findall(text)
+        
+        # URLs
+        entities["urls"] = rules.URL_RE.findall(text)
+        
+        # 8. Adresses (tous les motifs en un seul parcours)
+        entities["addresses"] = [match.group(0) for _, match in rules.ADDRESS_SCANNER.scan(text)]
     
     # 9. Personnes (noms propres suivis de titres)
-    person_patterns = [
-        r'(M\.|Mme|Mlle|Dr|Prof|Directeur|Directrice)\s+([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)',
-        r'([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)\s+\(([^)]+)\)',
-        r'Sign[ée]\s+par\s+([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)'
-    ]
-    
-    for pattern in person_patterns:
-        matches = re.findall(pattern, text)
-        for match in matches:
-            if isinstance(match, tuple):
-                name = match[1] if len(match) > 1 else match[0]
-            else:
-                name = match
+    if "persons" in wanted:
+        for _, match in rules.PERSON_SCANNER.scan(text):
+            # le nom : second groupe du motif s'il en a deux, sinon le seul
+            groups = match.groups()
+            name = groups[1] if len(groups) > 1 else groups[0]
             
             if name not in entities["persons"] and len(name.split()) >= 2:
                 entities["persons"].append(name)
@@ -257,26 +303,139 @@ def extract_entities_structured(text, data_dict=None):
     
     return entities
 
-def extract_document_info(img_path):
-    """Fonction principale d'extraction - robuste pour tous types de documents"""
-    
+def extract_document_info(source, return_layout=False):
+    """Fonction principale d'extraction - robuste pour tous types de documents
+
+    `source` : chemin de l'image ou contenu en mémoire (octets, numpy, PIL).
+    `return_layout` : ajouter "layout" (mots + boîtes 0-1000) au résultat,
+    pour passer l'OCR au modèle NER (model.extract_entities_batch).
+    """
+    start = time.perf_counter()
+    with metrics.collect() as timings:
+        response = _extract_document_info(source, return_layout)
+
+    # durées par étape (ms) ; additionnées dans les histogrammes de /metrics
+    timings.add("total", (time.perf_counter() - start) * 1000)
+    response["metadata"].update({
+        "processed_at": datetime.now().isoformat(),
+        "processing_time_ms": round(timings.ms["total"], 1),
+        "timings_ms": timings.as_dict(),
+    })
+    return response
+
+
+def preprocess_once(gray, profile, info, cache, deskew=True):
+    """
+    Prétraitement de la page décodée, mémoïsé par (profil, redressement) dans
+    `cache` (dict propre à la page) : le chemin complet réutilise l'image des
+    zones quand un modèle reconnu échoue avec le même profil et que la page
+    n'avait pas à être redressée.
+    """
+    profile = profile or preprocessing.PREPROCESS_PROFILE
+    key = (profile, deskew)
+    if key not in cache:
+        cache[key] = preprocess_image_for_ocr(gray, profile=profile, info=info, deskew=deskew)
+        stats = info.get("stats")
+        if profile != "auto" or (stats is not None and not preprocessing.needs_deskew(stats)):
+            # aucune rotation possible : même image avec ou sans redressement
+            cache[(profile, not deskew)] = cache[key]
+    return cache[key]
+
+
+def extract_with_template(source, gray, preprocess_info, processed_cache, return_layout=False):
+    """
+    Chemin rapide : formulaire reconnu par son empreinte -> OCR des seules
+    zones enregistrées (templates.py). None si aucun modèle ne correspond.
+    """
+    template, distance = templates.match_page(gray)
+    if template is None:
+        return None
+
+    # zones en coordonnées de la page décodée (celle de l'empreinte) : pas de redressement
+    processed = preprocess_once(gray, template.get("profile"), preprocess_info, processed_cache,
+                                deskew=False)
+    processed = np.asarray(processed.convert("L") if isinstance(processed, Image.Image) else processed)
+    extracted = templates.extract_fields(template, processed, OCR_LANG)
+    if extracted is None:
+        logger.info("Modèle %s reconnu mais champ obligatoire vide : chemin complet",
+                    template["name"])
+        return None
+    fields, text, zone_data = extracted
+
+    response = {
+        "document_type": template["document_type"],
+        "confidence": round(1.0 - distance, 4),
+        "extraction_method": "template",
+        "fields": {k: v for k, v in fields.items() if v is not None and v != [] and v != {}},
+        "raw_ocr_preview": text[:500] + "..." if len(text) > 500 else text,
+        "metadata": {
+            "image_path": source if isinstance(source, str) else None,
+            "ocr_engine": "tesseract",
+            "ocr_backend": ocr_backends.OCR_BACKEND,
+            "preprocessing": preprocess_info,
+            "template": {"name": template["name"], "distance": round(distance, 4)},
+        }
+    }
+    if return_layout:
+        # mots des seules zones : le NER ne relance pas l'OCR de la page
+        response["layout"] = layout_from_ocr_data(zone_data)
+    return response
+
+
+def _extract_document_info(source, return_layout):
     try:
-        # 1. OCR avancé avec prétraitement
-        text, ocr_data = extract_text_with_layout(img_path, lang='fra+eng')
+        # 1. Image décodée une seule fois (empreinte, classification, prétraitement)
+        with metrics.stage("decode"):
+            gray = load_gray(source)
+        preprocess_info, processed_cache = {}, {}
+
+        # 2. Formulaire connu : OCR des seules zones enregistrées
+        if templates.TEMPLATES_ENABLED:
+            response = extract_with_template(source, gray, preprocess_info, processed_cache,
+                                             return_layout)
+            if response is not None:
+                return response
+
+        # 3. Type d'après l'en-tête : il ne choisit que les réglages du passage
+        # complet ; le type final vient du texte de la page (ordre de priorité
+        # des mots-clés), sauf pour les types dont l'en-tête suffit
+        document_type, settings, classification = None, {}, None
+        if classify.CLASSIFY_ENABLED:
+            start = time.perf_counter()
+            header_type, header_text, header_data = classify.classify(gray, OCR_LANG)
+            classification = {"document_type": header_type,
+                              "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                              "header_only": header_type in classify.HEADER_ONLY_TYPES}
+            if header_type != rules.DEFAULT_DOCUMENT_TYPE:
+                settings = classify.settings_for(header_type)
+            if classification["header_only"]:
+                document_type = header_type
+
+        # 4. OCR de la page, sauf pour les types dont l'en-tête suffit
+        if classification and classification["header_only"]:
+            # mots de l'en-tête en coordonnées page : layout du NER sans OCR de la page
+            text, ocr_data = header_text, header_data
+            extraction_method = "ocr_rules_header"
+        else:
+            processed_img = preprocess_once(gray, settings.get("profile"), preprocess_info,
+                                            processed_cache)
+            text, ocr_data = extract_text_with_layout(source, lang=settings.get("lang", OCR_LANG),
+                                                      info=preprocess_info, processed=processed_img)
+            extraction_method = "ocr_rules_based"
         
-        print("=" * 60)
-        print("TEXTE EXTRAIT (premières 1000 caractères):")
-        print(text[:1000])
-        print("=" * 60)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Texte extrait (1000 premiers caractères):\n%s", text[:1000])
         
-        # 2. Extraction structurée
-        entities = extract_entities_structured(text, ocr_data)
+        # 5. Extraction structurée
+        with metrics.stage("rules"):
+            entities = extract_entities_structured(text, ocr_data, document_type=document_type,
+                                                   rule_groups=settings.get("rules"))
         
-        # 3. Format de réponse standardisé
+        # 6. Format de réponse standardisé
         response = {
             "document_type": entities["document_type"],
             "confidence": 0.95,
-            "extraction_method": "ocr_rules_based",
+            "extraction_method": extraction_method,
             "fields": {
                 "title": entities["title"],
                 "organization": entities["organization"],
@@ -293,19 +452,24 @@ def extract_document_info(img_path):
             },
             "raw_ocr_preview": text[:500] + "..." if len(text) > 500 else text,
             "metadata": {
-                "processing_time": datetime.now().isoformat(),
-                "image_path": img_path,
-                "ocr_engine": "tesseract"
+                "image_path": source if isinstance(source, str) else None,
+                "ocr_engine": "tesseract",
+                "ocr_backend": ocr_backends.OCR_BACKEND,
+                "preprocessing": preprocess_info,
+                "classification": classification
             }
         }
         
-        # 4. Nettoyer les valeurs None
+        # 7. Nettoyer les valeurs None
         response["fields"] = {k: v for k, v in response["fields"].items() if v is not None and v != [] and v != {}}
+
+        if return_layout and ocr_data is not None:
+            response["layout"] = layout_from_ocr_data(ocr_data)
         
         return response
         
     except Exception as e:
-        print(f"Erreur dans extract_document_info: {e}")
+        logger.exception("Erreur dans extract_document_info: %s", e)
         # Retourner une structure minimale en cas d'erreur
         return {
             "document_type": "unknown",
@@ -313,8 +477,7 @@ def extract_document_info(img_path):
             "error": str(e),
             "fields": {},
             "metadata": {
-                "error": True,
-                "processing_time": datetime.now().isoformat()
+                "error": True
             }
         }
 
@@ -340,7 +503,7 @@ def test_extraction():
             
             print("\nMétadonnées:")
             print(f"  Méthode: {result.get('extraction_method', 'N/A')}")
-            print(f"  Temps: {result['metadata']['processing_time']}")
+            print(f"  Temps: {result['metadata']['processing_time_ms']} ms")
             
         except Exception as e:
             print(f"Erreur avec {img_file}: {e}")
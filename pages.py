@@ -0,0 +1,185 @@
+# pages.py
+# Documents multi-pages (PDF, TIFF) : rastérisation paresseuse page par page,
+# traitement en parallèle par la file de jobs et fusion des résultats.
+import io
+import os
+from datetime import datetime
+from collections import deque, Counter
+
+from PIL import Image, ImageSequence
+
+from image_io import load_image
+from jobs import run_extraction, QueueFullError
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+PAGE_DPI = int(os.environ.get("ADMINDOC_PAGE_DPI", 200))
+# Pages rastérisées simultanément en mémoire (soumises au pool ou en attente)
+PAGES_IN_FLIGHT = int(os.environ.get("ADMINDOC_PAGES_IN_FLIGHT", os.cpu_count() or 1))
+
+
+def detect_format(data):
+    """'pdf', 'tiff' ou 'image' d'après la signature du fichier"""
+    if data[:5] == b"%PDF-":
+        return "pdf"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return "image"
+
+
+def is_multipage(data):
+    return detect_format(data) in ("pdf", "tiff")
+
+
+# ============================================================
+# RASTÉRISATION (générateurs : une page en mémoire à la fois)
+# ============================================================
+
+def _iter_pdf_pages(data, dpi):
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                pil_page = page.render(scale=dpi / 72).to_pil()
+                page.close()
+                yield load_image(pil_page)
+        finally:
+            pdf.close()
+        return
+
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise RuntimeError("Lecture PDF impossible : installer pypdfium2 (ou PyMuPDF)")
+
+    import cv2
+    import numpy as np
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi)
+            rgb = np.frombuffer(pix.samples, np.uint8).reshape(pix.h, pix.w, pix.n)
+            yield cv2.cvtColor(rgb[:, :, :3], cv2.COLOR_RGB2BGR)
+
+
+def _iter_tiff_pages(data):
+    with Image.open(io.BytesIO(data)) as tiff:
+        for frame in ImageSequence.Iterator(tiff):
+            yield load_image(frame)
+
+
+def iter_pages(data, dpi=PAGE_DPI):
+    """Pages du document en tableaux numpy BGR, produites une à une"""
+    fmt = detect_format(data)
+    if fmt == "pdf":
+        yield from _iter_pdf_pages(data, dpi)
+    elif fmt == "tiff":
+        yield from _iter_tiff_pages(data)
+    else:
+        yield load_image(data)
+
+
+# ============================================================
+# TRAITEMENT PARALLÈLE
+# ============================================================
+
+def process_pages(data, job_queue, dpi=PAGE_DPI, max_in_flight=PAGES_IN_FLIGHT, file_id=None):
+    """
+    Soumettre les pages à la file de jobs au fil de la rastérisation et
+    produire (numéro de page, résultat) dans l'ordre des pages.
+    La mémoire reste bornée par `max_in_flight` pages. Chaque page compte
+    dans la limite de jobs en attente : quand la file est pleine, on attend
+    d'abord les pages déjà soumises ; QueueFullError si aucune ne l'est.
+    """
+    in_flight = deque()
+
+    def next_result():
+        page_num, job = in_flight.popleft()
+        job.done.wait()
+        if job.error is not None:
+            return page_num, {"document_type": "unknown", "confidence": 0.0,
+                              "error": job.error, "fields": {}}
+        return page_num, job.result
+
+    for page_num, page in enumerate(iter_pages(data, dpi), 1):
+        while True:
+            try:
+                job = job_queue.submit(run_extraction, page, file_id=file_id)
+                break
+            except QueueFullError:
+                if not in_flight:
+                    raise
+                yield next_result()
+        in_flight.append((page_num, job))
+        del page
+        if len(in_flight) >= max_in_flight:
+            yield next_result()
+
+    while in_flight:
+        yield next_result()
+
+
+# ============================================================
+# FUSION
+# ============================================================
+
+def merge_page_results(page_results):
+    """Résultat au niveau du document à partir des résultats par page"""
+    page_results = [r for r in page_results if r is not None]
+    valid = [r for r in page_results if "error" not in r]
+
+    timings = {}
+    for r in page_results:
+        for name, ms in r.get("metadata", {}).get("timings_ms", {}).items():
+            timings[name] = round(timings.get(name, 0.0) + ms, 2)
+
+    types = Counter(r.get("document_type") for r in valid
+                    if r.get("document_type") not in (None, "unknown", "document_generique"))
+    if types:
+        document_type = types.most_common(1)[0][0]
+    elif valid:
+        document_type = valid[0].get("document_type", "unknown")
+    else:
+        document_type = "unknown"
+
+    fields = {}
+    for result in valid:
+        for key, value in result.get("fields", {}).items():
+            if isinstance(value, list):
+                merged = fields.setdefault(key, [])
+                merged.extend(v for v in value if v not in merged)
+            elif isinstance(value, dict):
+                merged = fields.setdefault(key, {})
+                for sub_key, sub_value in value.items():
+                    merged.setdefault(sub_key, sub_value)
+            elif key not in fields:
+                # première page qui fournit le champ
+                fields[key] = value
+
+    merged = {
+        "document_type": document_type,
+        "confidence": round(sum(r.get("confidence", 0.0) for r in valid) / len(valid), 4) if valid else 0.0,
+        "extraction_method": valid[0].get("extraction_method", "ocr_rules_based") if valid else "ocr_rules_based",
+        "fields": fields,
+        "raw_ocr_preview": valid[0].get("raw_ocr_preview", "") if valid else "",
+        "metadata": {
+            "pages": len(page_results),
+            "failed_pages": len(page_results) - len(valid),
+            "processed_at": datetime.now().isoformat(),
+            # temps de calcul cumulé des pages (elles tournent en parallèle)
+            "processing_time_ms": round(sum(r.get("metadata", {}).get("processing_time_ms", 0.0)
+                                            for r in page_results), 1),
+            "timings_ms": timings,
+        },
+    }
+    if not valid:
+        merged["error"] = "Aucune page traitée"
+    return merged
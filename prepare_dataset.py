@@ -1,7 +1,17 @@
 import os
 import json
+import struct
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 from PIL import Image
 
+from image_io import normalize_box
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
 def load_funsd_annotation(json_path):
     """
     Charge l'annotation au format FUNSD.
@@ -42,66 +52,201 @@ def load_funsd_annotation(json_path):
     return words, boxes, labels
 
 
-def normalize_box(box, width, height):
-    """ Normalise les bounding boxes entre 0 et 1000 """
-    x1, y1, x2, y2 = box
-    return [
-        int(1000 * x1 / width),
-        int(1000 * y1 / height),
-        int(1000 * x2 / width),
-        int(1000 * y2 / height),
-    ]
-
-
-def prepare_dataset(image_dir, ann_dir, output_jsonl):
-    dataset = []
-
-    for file in os.listdir(image_dir):
-        if not file.lower().endswith(".png"):
-            continue
-
-        img_path = os.path.join(image_dir, file)
-        json_path = os.path.join(ann_dir, file.replace(".png", ".json"))
+def image_size(img_path):
+    """
+    (largeur, hauteur) lues dans l'en-tête, sans décoder les pixels :
+    chunk IHDR pour les PNG, sinon ouverture paresseuse par PIL.
+    """
+    with open(img_path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == PNG_SIGNATURE and header[12:16] == b"IHDR":
+        return struct.unpack(">II", header[16:24])
 
-        if not os.path.exists(json_path):
-            print("⚠ No annotation for", file)
-            continue
+    with Image.open(img_path) as image:
+        return image.size
 
-        image = Image.open(img_path)
-        width, height = image.size
 
-        words, boxes, labels = load_funsd_annotation(json_path)
+def file_signature(path):
+    """(mtime, taille) : test rapide de modification sans lire le fichier"""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
 
-        # normalisation des boxes
-        norm_boxes = [normalize_box(b, width, height) for b in boxes]
 
-        # Format LayoutLMv3 JSONL
-        entry = {
-            "id": file,
-            "image_path": os.path.join(image_dir, file),
-            "words": words,
-            "boxes": norm_boxes,
-            "ner_tags": labels,
-        }
+def content_hash(*paths):
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
 
 
-        dataset.append(entry)
-        print("✔ Processed:", file)
+# ============================================================
+# TRAITEMENT D'UN FICHIER (worker)
+# ============================================================
 
-    # écrire dans un JSONL
-    with open(output_jsonl, "w", encoding="utf-8") as f:
-        for item in dataset:
-            f.write(json.dumps(item) + "\n")
+def process_file(image_dir, ann_dir, file, known_hash=None):
+    """
+    Retourne (hash du contenu, entrée JSONL) ; entrée None si le contenu
+    est identique à `known_hash` (seuls les mtimes ont changé).
+    """
+    img_path = os.path.join(image_dir, file)
+    json_path = os.path.join(ann_dir, file.replace(".png", ".json"))
+
+    digest = content_hash(img_path, json_path)
+    if digest == known_hash:
+        return digest, None
+
+    width, height = image_size(img_path)
+
+    words, boxes, labels = load_funsd_annotation(json_path)
+
+    # normalisation des boxes
+    norm_boxes = [normalize_box(b, width, height) for b in boxes]
+
+    # Format LayoutLMv3 JSONL
+    entry = {
+        "id": file,
+        "image_path": img_path,
+        "words": words,
+        "boxes": norm_boxes,
+        "ner_tags": labels,
+    }
+    return digest, entry
+
+
+# ============================================================
+# ÉTAT DE LA DERNIÈRE EXÉCUTION (mode incrémental)
+# ============================================================
+
+def state_path(output_jsonl):
+    return output_jsonl + ".state.json"
+
+
+def load_state(output_jsonl):
+    """Signatures de la dernière exécution, si la sortie correspondante existe"""
+    path = state_path(output_jsonl)
+    if not (os.path.exists(path) and os.path.exists(output_jsonl)):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_records(output_jsonl):
+    """id -> position de la ligne dans le JSONL existant (aucun contenu en mémoire)"""
+    offsets = {}
+    if not os.path.exists(output_jsonl):
+        return offsets
+    with open(output_jsonl, "rb") as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                offsets[json.loads(line)["id"]] = offset
+    return offsets
+
+
+# ============================================================
+# PRÉPARATION (streaming, parallèle, incrémentale)
+# ============================================================
+
+def prepare_dataset(image_dir, ann_dir, output_jsonl, workers=None, incremental=True,
+                    max_in_flight=None):
+    """
+    Écrit le JSONL au fil de l'eau, dans l'ordre des noms de fichiers (la
+    fin du fichier sert de jeu d'évaluation : l'ordre doit être stable).
+    Les fichiers dont l'image et l'annotation n'ont pas changé depuis la
+    dernière exécution (mtime/taille, sinon contenu) sont recopiés tels quels.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 4 * workers
+
+    previous_state = load_state(output_jsonl) if incremental else {}
+    offsets = index_records(output_jsonl) if previous_state else {}
+    state = {}
+    counts = {"processed": 0, "unchanged": 0, "missing_annotation": 0}
+
+    tmp_path = output_jsonl + ".tmp"
+    previous = open(output_jsonl, "rb") if offsets else None
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out, \
+                ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+
+            def write_next():
+                file, signature, known, result = in_flight.popleft()
+                if result is None:
+                    # mtimes et tailles identiques : recopier la ligne existante
+                    digest, entry = known, None
+                else:
+                    digest, entry = result.result()
+
+                if entry is None:
+                    previous.seek(offsets[file])
+                    out.write(previous.readline().decode("utf-8").rstrip("\n") + "\n")
+                    counts["unchanged"] += 1
+                else:
+                    out.write(json.dumps(entry) + "\n")
+                    counts["processed"] += 1
+                    print("✔ Processed:", file)
+                state[file] = {"signature": signature, "hash": digest}
+
+            for file in sorted(os.listdir(image_dir)):
+                if not file.lower().endswith(".png"):
+                    continue
+
+                img_path = os.path.join(image_dir, file)
+                json_path = os.path.join(ann_dir, file.replace(".png", ".json"))
+
+                if not os.path.exists(json_path):
+                    print("⚠ No annotation for", file)
+                    counts["missing_annotation"] += 1
+                    continue
+
+                signature = [file_signature(img_path), file_signature(json_path)]
+                known = previous_state.get(file) if file in offsets else None
+
+                if known and known["signature"] == signature:
+                    in_flight.append((file, signature, known["hash"], None))
+                else:
+                    future = executor.submit(process_file, image_dir, ann_dir, file,
+                                             known and known["hash"])
+                    in_flight.append((file, signature, None, future))
+
+                if len(in_flight) >= max_in_flight:
+                    write_next()
+
+            while in_flight:
+                write_next()
+    finally:
+        if previous is not None:
+            previous.close()
+
+    # remplacer la sortie seulement une fois complète
+    os.replace(tmp_path, output_jsonl)
+    with open(state_path(output_jsonl), "w", encoding="utf-8") as f:
+        json.dump(state, f)
 
     print("\n==============================")
     print("Dataset READY →", output_jsonl)
-    print("Total documents:", len(dataset))
+    print("Total documents:", len(state))
+    print("Processed:", counts["processed"], "| Unchanged:", counts["unchanged"],
+          "| Missing annotation:", counts["missing_annotation"])
     print("==============================\n")
+    return counts
 
 
 if __name__ == "__main__":
-    prepare_dataset(
-        "dataset/training_data/images",
-        "dataset/training_data/annotations",
-        "train_data.jsonl"
-    )
+    parser = argparse.ArgumentParser(description="Préparation du dataset LayoutLMv3 (JSONL)")
+    parser.add_argument("--images", default="dataset/training_data/images")
+    parser.add_argument("--annotations", default="dataset/training_data/annotations")
+    parser.add_argument("--output", default="train_data.jsonl")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--full", action="store_true",
+                        help="tout retraiter (ignorer l'état de la dernière exécution)")
+    args = parser.parse_args()
+
+    prepare_dataset(args.images, args.annotations, args.output,
+                    workers=args.workers, incremental=not args.full)
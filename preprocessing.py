@@ -0,0 +1,202 @@
+# preprocessing.py
+# Profils de prétraitement avant OCR :
+#   "quality" : débruitage NLM + CLAHE + binarisation adaptative (chaîne d'origine)
+#   "fast"    : filtre médian + binarisation adaptative
+#   "none"    : binarisation adaptative seule
+#   "auto"    : "quality" seulement pour les images bruitées ou petites,
+#               redressement préalable des pages penchées
+# Chaque étape est chronométrée.
+import os
+import time
+
+import cv2
+import numpy as np
+
+from image_io import load_gray
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+PREPROCESS_PROFILE = os.environ.get("ADMINDOC_PREPROCESS_PROFILE", "auto")
+
+PROFILE_STEPS = {
+    "quality": ("denoise_nlm", "clahe", "threshold"),
+    "fast": ("median", "threshold"),
+    "none": ("threshold",),
+}
+PREPROCESS_PROFILES = ("auto",) + tuple(PROFILE_STEPS)
+
+# Seuils du profil "auto"
+AUTO_NOISE_SIGMA = float(os.environ.get("ADMINDOC_AUTO_NOISE_SIGMA", 6.0))
+AUTO_MIN_SIDE = 500
+AUTO_MAX_SKEW = 2.0  # degrés : au-delà, "auto" redresse la page
+
+# Zone centrale analysée pour l'estimation du bruit (pixels)
+STATS_CROP = 512
+
+
+# ============================================================
+# STATISTIQUES RAPIDES
+# ============================================================
+
+def estimate_noise(gray, edge_quantile=0.8):
+    """
+    Écart-type du bruit (méthode d'Immerkær) sur une zone centrale, en
+    ignorant les pixels de contour (bords des caractères) qui fausseraient
+    l'estimation sur une page de texte.
+    """
+    height, width = gray.shape
+    top = max(0, (height - STATS_CROP) // 2)
+    left = max(0, (width - STATS_CROP) // 2)
+    crop = gray[top:top + STATS_CROP, left:left + STATS_CROP].astype(np.float32)
+    if crop.shape[0] < 3 or crop.shape[1] < 3:
+        return 0.0
+
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = np.abs(cv2.filter2D(crop, -1, kernel)[1:-1, 1:-1])
+
+    gradient = np.abs(cv2.Sobel(crop, cv2.CV_32F, 1, 0)) + np.abs(cv2.Sobel(crop, cv2.CV_32F, 0, 1))
+    gradient = gradient[1:-1, 1:-1]
+    flat = gradient <= np.quantile(gradient, edge_quantile)
+    if not flat.any():
+        return 0.0
+
+    return float(np.sqrt(np.pi / 2) * response[flat].mean() / 6.0)
+
+
+def estimate_skew(gray, max_width=800):
+    """Angle d'inclinaison du texte (degrés) sur une version réduite de la page"""
+    height, width = gray.shape
+    if width > max_width:
+        gray = cv2.resize(gray, (max_width, int(height * max_width / width)),
+                          interpolation=cv2.INTER_AREA)
+
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(ink)
+    if coords is None or len(coords) < 50:
+        return 0.0
+
+    angle = cv2.minAreaRect(coords)[-1]
+    # ramener dans [-45, 45] quelle que soit la convention d'OpenCV
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    return float(angle)
+
+
+def image_stats(gray):
+    height, width = gray.shape
+    return {
+        "width": width,
+        "height": height,
+        "noise_sigma": round(estimate_noise(gray), 2),
+        "skew_deg": round(estimate_skew(gray), 2),
+    }
+
+
+def choose_profile(stats):
+    """Profil "auto" : la chaîne coûteuse seulement quand l'image le justifie"""
+    if stats["noise_sigma"] > AUTO_NOISE_SIGMA:
+        return "quality"
+    if min(stats["width"], stats["height"]) < AUTO_MIN_SIDE:
+        return "quality"
+    # l'inclinaison est corrigée par l'étape "deskew", pas par le profil
+    return "fast"
+
+
+# ============================================================
+# ÉTAPES
+# ============================================================
+
+def _denoise_nlm(img):
+    return cv2.fastNlMeansDenoising(img, None, 30, 7, 21)
+
+
+def _clahe(img):
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe.apply(img)
+
+
+def _deskew(img, angle):
+    """Rotation de `angle` degrés (estimate_skew) autour du centre ; les coins
+    découverts reprennent le fond de la page"""
+    height, width = img.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+
+def _median(img):
+    return cv2.medianBlur(img, 3)
+
+
+def _threshold(img):
+    return cv2.adaptiveThreshold(img, 255,
+                                 cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 11, 2)
+
+
+STEPS = {
+    "denoise_nlm": _denoise_nlm,
+    "clahe": _clahe,
+    "median": _median,
+    "threshold": _threshold,
+}
+
+
+def _resize_if_small(img):
+    height, width = img.shape
+    if height < 500 or width < 500:
+        scale = 2
+        return cv2.resize(img, (int(width * scale), int(height * scale)),
+                          interpolation=cv2.INTER_CUBIC)
+    return img
+
+
+def needs_deskew(stats):
+    """Le profil "auto" redresse-t-il cette page ?"""
+    return abs(stats["skew_deg"]) > AUTO_MAX_SKEW
+
+
+def preprocess(source, profile=None, info=None, deskew=True):
+    """
+    Image prétraitée (numpy 2D). Si `info` est un dict, il reçoit le profil
+    utilisé, les statistiques de l'image et la durée de chaque étape (ms).
+    `deskew=False` conserve la géométrie de la page (zones des modèles).
+    """
+    profile = profile or PREPROCESS_PROFILE
+    if profile not in PREPROCESS_PROFILES:
+        raise ValueError(f"Profil inconnu: {profile} (attendu: {', '.join(PREPROCESS_PROFILES)})")
+
+    timings = {}
+
+    start = time.perf_counter()
+    img = load_gray(source)
+    timings["decode"] = (time.perf_counter() - start) * 1000
+
+    stats = None
+    if profile == "auto":
+        start = time.perf_counter()
+        stats = image_stats(img)
+        profile = choose_profile(stats)
+        timings["stats"] = (time.perf_counter() - start) * 1000
+
+        if deskew and needs_deskew(stats):
+            start = time.perf_counter()
+            img = _deskew(img, stats["skew_deg"])
+            timings["deskew"] = (time.perf_counter() - start) * 1000
+
+    for step in PROFILE_STEPS[profile] + ("resize",):
+        start = time.perf_counter()
+        img = _resize_if_small(img) if step == "resize" else STEPS[step](img)
+        timings[step] = (time.perf_counter() - start) * 1000
+
+    if info is not None:
+        info["profile"] = profile
+        if stats is not None:
+            info["stats"] = stats
+        info["timings_ms"] = {k: round(v, 2) for k, v in timings.items()}
+
+    return img
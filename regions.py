@@ -0,0 +1,201 @@
+# regions.py
+# OCR parallèle par régions pour les grandes pages : découpage XY-cut de
+# l'image binarisée (ordre de lecture), OCR de chaque région dans un pool de
+# processus, puis assemblage des données image_to_data en coordonnées page.
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ocr_backends import DATA_KEYS
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Nombre de processus OCR ; chaque Tesseract est limité à un thread OpenMP
+REGION_WORKERS = int(os.environ.get("ADMINDOC_OCR_REGION_WORKERS", os.cpu_count() or 1))
+# En dessous de cette taille (pixels), la page est traitée en un seul appel
+REGION_MIN_PIXELS = int(os.environ.get("ADMINDOC_OCR_REGION_MIN_PIXELS", 2_000_000))
+
+# Une région plus petite n'est plus découpée (pixels)
+REGION_MIN_AREA = 150_000
+# Marge blanche ajoutée autour de chaque région (pixels), au plus la moitié
+# du plus petit espace de découpe (voir region_padding)
+REGION_PADDING = 10
+
+
+# ============================================================
+# DÉCOUPAGE (XY-cut)
+# ============================================================
+
+def _widest_gap(profile, min_gap):
+    """
+    Plus large intervalle vide (début, fin) d'au moins `min_gap` pixels, à
+    largeur égale le plus proche du centre (découpes équilibrées) ; None sinon.
+    """
+    empty = np.concatenate(([False], profile, [False]))
+    changes = np.flatnonzero(np.diff(empty.astype(np.int8)))
+    center = len(profile) / 2
+    best = None
+    for start, end in zip(changes[::2], changes[1::2]):
+        size = end - start
+        if size < min_gap:
+            continue
+        score = (size, -abs((start + end) / 2 - center))
+        if best is None or score > best[0]:
+            best = (score, int(start), int(end))
+    return best and best[1:]
+
+
+def _xy_cut(ink, x, y, min_area, min_gap_y, min_gap_x, boxes):
+    # rogner les marges vides
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if rows.size == 0:
+        return
+    ink = ink[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    x, y = int(x + cols[0]), int(y + rows[0])
+    height, width = ink.shape
+
+    if height * width > min_area:
+        # couper au plus large espace blanc : entre paragraphes (haut puis
+        # bas) ou entre colonnes (gauche puis droite)
+        row_gap = _widest_gap(~ink.any(axis=1), min_gap_y)
+        col_gap = _widest_gap(~ink.any(axis=0), min_gap_x)
+        if col_gap and (not row_gap or col_gap[1] - col_gap[0] > row_gap[1] - row_gap[0]):
+            left, right = col_gap
+            _xy_cut(ink[:, :left], x, y, min_area, min_gap_y, min_gap_x, boxes)
+            _xy_cut(ink[:, right:], x + right, y, min_area, min_gap_y, min_gap_x, boxes)
+            return
+        if row_gap:
+            top, bottom = row_gap
+            _xy_cut(ink[:top], x, y, min_area, min_gap_y, min_gap_x, boxes)
+            _xy_cut(ink[bottom:], x, y + bottom, min_area, min_gap_y, min_gap_x, boxes)
+            return
+
+    boxes.append((x, y, width, height))
+
+
+def min_gaps(shape):
+    """Espaces blancs minimaux (vertical, horizontal) pour couper une page"""
+    height, width = shape[:2]
+    return max(8, height // 120), max(20, width // 40)
+
+
+def region_padding(shape, padding=REGION_PADDING):
+    """Marge bornée à la moitié du plus petit espace de découpe : deux
+    régions voisines ne se recouvrent pas"""
+    return min(padding, min(min_gaps(shape)) // 2)
+
+
+def find_regions(binary, workers=REGION_WORKERS):
+    """
+    Régions de texte (x, y, largeur, hauteur) dans l'ordre de lecture.
+    `binary` : image binarisée, texte sombre sur fond clair.
+    Les régions ne sont découpées que tant qu'elles restent plus grandes
+    que la part d'un worker : les petits blocs ne coûtent pas un appel
+    Tesseract chacun.
+    """
+    height, width = binary.shape
+    ink = binary < 128
+    # bruit isolé : une ligne de pixels avec très peu d'encre compte comme vide
+    ink &= (ink.sum(axis=1, keepdims=True) > 2)
+
+    min_area = max(REGION_MIN_AREA, height * width // (2 * max(1, workers)))
+    min_gap_y, min_gap_x = min_gaps(binary.shape)
+
+    boxes = []
+    _xy_cut(ink, 0, 0, min_area, min_gap_y, min_gap_x, boxes)
+    return boxes
+
+
+def crop_region(img, box, padding=None):
+    """
+    Région avec une marge blanche ; retourne (image, x, y) de l'origine.
+    La marge est blanchie : l'encre des régions voisines n'y est pas lue.
+    """
+    if padding is None:
+        padding = region_padding(img.shape)
+    x, y, width, height = box
+    x0, y0 = max(0, x - padding), max(0, y - padding)
+    x1 = min(img.shape[1], x + width + padding)
+    y1 = min(img.shape[0], y + height + padding)
+    crop = np.full((y1 - y0, x1 - x0), 255, dtype=img.dtype)
+    crop[y - y0:y - y0 + height, x - x0:x - x0 + width] = img[y:y + height, x:x + width]
+    return crop, x0, y0
+
+
+# ============================================================
+# ASSEMBLAGE
+# ============================================================
+
+def merge_region_data(region_results, page_size):
+    """
+    Fusionner les sorties image_to_data des régions (dans l'ordre de lecture)
+    en une seule, comme pour un appel sur la page entière : coordonnées
+    décalées à l'origine de chaque région, blocs renumérotés.
+    """
+    width, height = page_size
+    merged = {key: [] for key in DATA_KEYS}
+
+    def append(**row):
+        for key in DATA_KEYS:
+            merged[key].append(row[key])
+
+    append(level=1, page_num=1, block_num=0, par_num=0, line_num=0, word_num=0,
+           left=0, top=0, width=width, height=height, conf=-1, text="")
+
+    block_offset = 0
+    for data, x0, y0 in region_results:
+        max_block = 0
+        for i, level in enumerate(data["level"]):
+            if level == 1:
+                continue
+            block = data["block_num"][i]
+            max_block = max(max_block, block)
+            append(level=level, page_num=1, block_num=block_offset + block,
+                   par_num=data["par_num"][i], line_num=data["line_num"][i],
+                   word_num=data["word_num"][i],
+                   left=data["left"][i] + x0, top=data["top"][i] + y0,
+                   width=data["width"][i], height=data["height"][i],
+                   conf=data["conf"][i], text=data["text"][i])
+        block_offset += max_block
+
+    return merged
+
+
+# ============================================================
+# POOL
+# ============================================================
+
+def _init_worker():
+    # un seul thread OpenMP par Tesseract : le parallélisme vient du pool.
+    # Lu au chargement de libgomp : le worker démarre en "spawn" pour que ce
+    # soit avant tout import de tesserocr (un fork hériterait du runtime
+    # OpenMP déjà initialisé par le processus principal).
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def pool_available():
+    """
+    Pas de pool de régions dans un worker d'un autre pool (jobs, pages,
+    batch_extract) : chaque worker lancerait REGION_WORKERS processus de plus.
+    Le parallélisme y vient déjà du pool parent.
+    """
+    return multiprocessing.parent_process() is None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_region_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=REGION_WORKERS, initializer=_init_worker,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
@@ -0,0 +1,164 @@
+# result_cache.py
+# Cache des résultats d'extraction, adressé par le contenu du fichier envoyé
+# et par la configuration du pipeline (langue, psm, version...).
+# Deux niveaux : LRU en mémoire + SQLite optionnel sur disque.
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+CACHE_MAX_ENTRIES = int(os.environ.get("ADMINDOC_CACHE_MAX_ENTRIES", 1024))
+CACHE_DB_PATH = os.environ.get("ADMINDOC_CACHE_DB")  # None = mémoire seule
+CACHE_DB_MAX_ENTRIES = int(os.environ.get("ADMINDOC_CACHE_DB_MAX_ENTRIES", 100000))
+CACHE_TTL = float(os.environ.get("ADMINDOC_CACHE_TTL", 7 * 24 * 3600))  # 0 = sans expiration
+
+
+def cache_key(data, config):
+    """Clé = hash des octets envoyés + hash de la configuration du pipeline"""
+    content_hash = hashlib.sha256(data).hexdigest()
+    config_hash = hashlib.sha256(
+        json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"{content_hash}:{config_hash}"
+
+
+class ResultCache:
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL,
+                 db_path=CACHE_DB_PATH, db_max_entries=CACHE_DB_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+        }
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+            self._db.commit()
+
+    def _expired(self, stored_at, now):
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def get(self, key):
+        """Résultat en cache ou None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self._counters["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, stored_at = row
+                    if not self._expired(stored_at, now):
+                        self._db.execute(
+                            "UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        value = json.loads(value)
+                        self._store_memory(key, stored_at, value)
+                        self._counters["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._counters["expired"] += 1
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store_memory(key, now, value)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, stored_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now))
+                self._evict_disk(now)
+                self._db.commit()
+
+    def _store_memory(self, key, stored_at, value):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _evict_disk(self, now):
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM results WHERE stored_at < ?", (now - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM results").fetchone()
+        overflow = count - self.db_max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN ("
+                " SELECT key FROM results ORDER BY accessed_at LIMIT ?)", (overflow,))
+            self._counters["disk_evictions"] += overflow
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else None
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_max_entries"] = self.max_entries
+            stats["ttl"] = self.ttl
+            if self._db is not None:
+                (stats["disk_entries"],) = self._db.execute(
+                    "SELECT COUNT(*) FROM results").fetchone()
+                stats["disk_path"] = self.db_path
+            return stats
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Cache global, configuré par les variables ADMINDOC_CACHE_*"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
@@ -0,0 +1,385 @@
+# rules.py
+# Règles d'extraction déclarées comme données et compilées une seule fois à
+# l'import. Les listes de mots-clés sont recherchées en un seul parcours du
+# texte (automate d'Aho–Corasick, sans accents ni casse) ; les dates courantes
+# sont normalisées sans passer par dateparser.
+import os
+import re
+import json
+import bisect
+import hashlib
+import unicodedata
+from collections import deque
+from datetime import datetime
+
+# ============================================================
+# RÈGLES
+# ============================================================
+
+# Table de mots-clés JSON qui remplace les listes ci-dessous (load_keyword_table)
+KEYWORDS_PATH = os.environ.get("ADMINDOC_KEYWORDS")
+
+# Types de document par ordre de priorité : le premier type dont un mot-clé
+# apparaît dans le texte (accents et casse ignorés) l'emporte
+DOCUMENT_TYPE_KEYWORDS = [
+    ("certificat_unesco", ['unesco', 'memoire du monde', 'organisation des nations unies']),
+    ("document_administratif_tunisien", ['archives nationales', 'présidence du gouvernement', 'république tunisienne']),
+    ("horaire_ouverture", ['horaires', 'horaire', 'ouverture', 'salle de lecture']),
+    ("certificat", ['inscription', 'certificat', 'registration']),
+]
+DEFAULT_DOCUMENT_TYPE = "document_generique"
+
+# Groupes de règles de extract_entities_structured
+RULE_GROUPS = ("title", "reference_number", "dates", "organization", "location",
+               "contacts", "persons")
+
+# Réglages du passage complet selon le type reconnu sur l'en-tête (classify.py) :
+# profil de prétraitement, langues Tesseract. Une entrée peut aussi limiter
+# les groupes de règles ("rules": sous-ensemble de RULE_GROUPS) ; aucune ne
+# le fait par défaut, pour ne pas vider des champs qu'une page contient.
+DOCUMENT_TYPE_SETTINGS = {
+    "certificat_unesco": {"profile": "auto", "lang": "fra+eng"},
+    "document_administratif_tunisien": {"profile": "auto", "lang": "fra"},
+    # affichettes imprimées, peu bruitées
+    "horaire_ouverture": {"profile": "fast", "lang": "fra"},
+    "certificat": {"lang": "fra+eng"},
+}
+
+# Organisations, par ordre de priorité
+ORGANIZATION_KEYWORDS = ['UNESCO', 'Archives Nationales', 'Présidence du gouvernement',
+                         'République Tunisienne', 'Organisation des Nations Unies']
+
+# Une ligne contenant un de ces mots n'est pas un titre
+TITLE_EXCLUDED_KEYWORDS = ['date', 'n°', 'numéro', 'téléphone', 'email', 'www']
+
+# Numéro de référence : premier motif qui correspond
+REFERENCE_PATTERNS = [
+    r'N[°ºo]\s*[:]?\s*([A-Z0-9\-/]+)',
+    r'Ref[ée]rence\s*[:]?\s*([A-Z0-9\-/]+)',
+    r'Num[ée]ro\s*[:]?\s*([A-Z0-9\-/]+)',
+    r'ID\s*[:]?\s*([A-Z0-9\-/]+)'
+]
+
+# Patterns de dates
+DATE_PATTERNS = [
+    r'(\d{1,2}\s+(?:janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre)\s+\d{4})',
+    r'(\d{1,2}[-/]\d{1,2}[-/]\d{2,4})',
+    r'(\d{1,2}\s+[A-Za-zÀ-ÿ]+\s+\d{4})',
+    r'le\s+(\d{1,2}\s+[A-Za-zÀ-ÿ]+\s+\d{4})',
+    r'(\d{4}[-/]\d{1,2}[-/]\d{1,2})',
+]
+
+# Localisation (ville, pays) : premier motif qui correspond
+LOCATION_PATTERNS = [
+    r'à\s+([A-Za-zÀ-ÿ]+)',
+    r'([A-Za-zÀ-ÿ]+)\s+Tunisie',
+    r'Tunis\s+([A-Za-zÀ-ÿ]+)'
+]
+
+PHONE_PATTERN = r'\(?\d{2,4}\)?[\s\-]?\d{2,3}[\s\-]?\d{2,3}[\s\-]?\d{2,3}'
+EMAIL_PATTERN = r'[\w\.-]+@[\w\.-]+\.\w+'
+URL_PATTERN = r'www\.\S+|\bhttps?://\S+'
+
+ADDRESS_PATTERNS = [
+    r'\d+,\s+[A-Za-zÀ-ÿ\s\d]+,\s+\d+\s+[A-Za-zÀ-ÿ]+',
+    r'[A-Za-zÀ-ÿ\s]+,\s+\d+\s+[A-Za-zÀ-ÿ]+',
+    r'\d+\s+[A-Za-zÀ-ÿ\s]+\s+\d{4,5}\s+[A-Za-zÀ-ÿ]+'
+]
+
+# Personnes (noms propres suivis de titres)
+PERSON_PATTERNS = [
+    r'(M\.|Mme|Mlle|Dr|Prof|Directeur|Directrice)\s+([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)',
+    r'([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)\s+\(([^)]+)\)',
+    r'Sign[ée]\s+par\s+([A-Z][a-zÀ-ÿ]+\s+[A-Z][a-zÀ-ÿ]+)'
+]
+
+# Mois reconnus par le chemin rapide de normalisation des dates
+MONTHS = {
+    # français
+    'janvier': 1, 'janv': 1, 'février': 2, 'fevrier': 2, 'févr': 2, 'fevr': 2,
+    'fév': 2, 'fev': 2, 'mars': 3, 'avril': 4, 'avr': 4, 'mai': 5, 'juin': 6,
+    'juillet': 7, 'juil': 7, 'août': 8, 'aout': 8, 'septembre': 9, 'sept': 9,
+    'octobre': 10, 'novembre': 11, 'décembre': 12, 'decembre': 12, 'déc': 12,
+    # anglais
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
+    'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7,
+    'august': 8, 'aug': 8, 'september': 9, 'sep': 9, 'october': 10, 'oct': 10,
+    'november': 11, 'nov': 11, 'december': 12, 'dec': 12,
+}
+
+
+# ============================================================
+# COMPILATION
+# ============================================================
+
+def fold(text):
+    """
+    Texte sans accents ni casse pour la recherche des mots-clés.
+    Retourne (texte replié, position d'origine de chaque caractère replié),
+    la table valant None quand les positions sont identiques.
+    """
+    if text.isascii():
+        return text.lower(), None
+
+    pieces = []
+    for ch in text:
+        piece = _FOLDED_CHARS.get(ch)
+        if piece is None:
+            piece = "".join(c for c in unicodedata.normalize("NFKD", ch)
+                            if not unicodedata.combining(c)).casefold()
+            _FOLDED_CHARS[ch] = piece
+        pieces.append(piece)
+
+    folded = "".join(pieces)
+    if len(folded) == len(text) and all(len(piece) == 1 for piece in pieces):
+        return folded, None
+    return folded, [i for i, piece in enumerate(pieces) for _ in piece]
+
+
+_FOLDED_CHARS = {}
+
+
+class KeywordAutomaton:
+    """
+    Aho–Corasick : toutes les occurrences de tous les mots-clés (sous-chaînes,
+    chevauchements compris) en un seul parcours du texte, quel que soit le
+    nombre de mots-clés. Mots-clés et texte sont repliés (fold).
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({fold(k)[0] for k in keywords if k})
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for keyword in self.keywords:
+            state = 0
+            for ch in keyword:
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._out[state] = (keyword,)
+
+        # liens d'échec en largeur : plus long suffixe qui est aussi un préfixe
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scan(self, text):
+        """Occurrences (début, fin, mot-clé replié), positions dans `text`"""
+        folded, origin = fold(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for keyword in out[state]:
+                matches.append((i + 1 - len(keyword), i + 1, keyword))
+
+        if origin is not None:
+            matches = [(origin[start], origin[end - 1] + 1, keyword)
+                       for start, end, keyword in matches]
+        return KeywordHits(matches)
+
+
+class KeywordHits:
+    """Résultat d'un parcours : `keyword in hits`, positions par mot-clé"""
+
+    def __init__(self, matches):
+        self.matches = matches
+        self._found = {keyword for _, _, keyword in matches}
+
+    def __contains__(self, keyword):
+        return keyword in self._found
+
+    def __len__(self):
+        return len(self._found)
+
+    def starts(self, keywords):
+        """Débuts (triés) des occurrences de ces mots-clés"""
+        return sorted(start for start, _, keyword in self.matches if keyword in keywords)
+
+
+class PatternScanner:
+    """
+    Liste de motifs sans ordre de priorité (on garde toutes les
+    correspondances) en une seule alternance de groupes nommés p0, p1... :
+    un seul finditer sur le texte, m.lastgroup donne le premier motif qui
+    reconnaît chaque position. Chaque alternative est une assertion avant,
+    pour que des motifs différents puissent se chevaucher (« le 12 mars
+    2019 » et « 12 mars 2019 ») : même résultat qu'un finditer par motif.
+    """
+
+    def __init__(self, patterns, flags=0):
+        self.regexes = [re.compile(p, flags) for p in patterns]
+        self.regex = re.compile("|".join(f"(?=(?P<p{i}>{p}))" for i, p in enumerate(patterns)),
+                                flags)
+
+    def scan(self, text):
+        """(indice du motif, match) triés par motif puis par position"""
+        ends = [0] * len(self.regexes)
+        matches = []
+        for hit in self.regex.finditer(text):
+            position = hit.start()
+            # les motifs suivants peuvent aussi commencer ici ; un motif ne
+            # reprend qu'après la fin de sa correspondance précédente
+            for index in range(int(hit.lastgroup[1:]), len(self.regexes)):
+                if ends[index] > position:
+                    continue
+                match = self.regexes[index].match(text, position)
+                if match:
+                    ends[index] = match.end()
+                    matches.append((index, match))
+        matches.sort(key=lambda item: (item[0], item[1].start()))
+        return matches
+
+
+def load_keyword_table(path):
+    """
+    Table de mots-clés JSON (clés facultatives, les autres gardent leur valeur
+    par défaut) : {"document_types": [[type, [mots-clés]], ...],
+    "organizations": [...], "title_excluded": [...]}
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    table = json.loads(raw)
+    return (
+        [(doc_type, list(words)) for doc_type, words in table.get("document_types", DOCUMENT_TYPE_KEYWORDS)],
+        list(table.get("organizations", ORGANIZATION_KEYWORDS)),
+        list(table.get("title_excluded", TITLE_EXCLUDED_KEYWORDS)),
+        hashlib.sha256(raw).hexdigest()[:12],
+    )
+
+
+KEYWORDS_VERSION = None
+if KEYWORDS_PATH:
+    (DOCUMENT_TYPE_KEYWORDS, ORGANIZATION_KEYWORDS, TITLE_EXCLUDED_KEYWORDS,
+     KEYWORDS_VERSION) = load_keyword_table(KEYWORDS_PATH)
+
+# Un seul automate pour les types, les organisations et le filtre des titres
+KEYWORDS = KeywordAutomaton(
+    [k for _, words in DOCUMENT_TYPE_KEYWORDS for k in words]
+    + ORGANIZATION_KEYWORDS + TITLE_EXCLUDED_KEYWORDS
+)
+_DOCUMENT_TYPES_FOLDED = [(doc_type, [fold(w)[0] for w in words])
+                          for doc_type, words in DOCUMENT_TYPE_KEYWORDS]
+_ORGANIZATIONS_FOLDED = [(name, fold(name)[0]) for name in ORGANIZATION_KEYWORDS]
+_TITLE_EXCLUDED_FOLDED = frozenset(fold(k)[0] for k in TITLE_EXCLUDED_KEYWORDS)
+_LINE_RE = re.compile(r'[^\n]+')
+
+REFERENCE_RES = [re.compile(p, re.IGNORECASE) for p in REFERENCE_PATTERNS]
+DATE_RES = [re.compile(p, re.IGNORECASE) for p in DATE_PATTERNS]
+LOCATION_RES = [re.compile(p, re.IGNORECASE) for p in LOCATION_PATTERNS]
+PHONE_RE = re.compile(PHONE_PATTERN)
+EMAIL_RE = re.compile(EMAIL_PATTERN)
+URL_RE = re.compile(URL_PATTERN)
+ADDRESS_RES = [re.compile(p) for p in ADDRESS_PATTERNS]
+PERSON_RES = [re.compile(p) for p in PERSON_PATTERNS]
+# Listes sans priorité (toutes les correspondances) : un seul parcours du texte
+DATE_SCANNER = PatternScanner(DATE_PATTERNS, re.IGNORECASE)
+ADDRESS_SCANNER = PatternScanner(ADDRESS_PATTERNS)
+PERSON_SCANNER = PatternScanner(PERSON_PATTERNS)
+
+_NUMERIC_DATE_RE = re.compile(r'(\d{1,2})([-/])(\d{1,2})\2(\d{2}|\d{4})')
+_ISO_DATE_RE = re.compile(r'(\d{4})([-/])(\d{1,2})\2(\d{1,2})')
+_MONTH_DATE_RE = re.compile(r'(\d{1,2})\s+([^\W\d_]+)\s+(\d{4})')
+
+
+# ============================================================
+# APPLICATION
+# ============================================================
+
+def keyword_hits(text):
+    """Tous les mots-clés du texte (types, organisations, exclusions de titre)"""
+    return KEYWORDS.scan(text)
+
+
+def match_document_type(hits):
+    for doc_type, words in _DOCUMENT_TYPES_FOLDED:
+        if any(word in hits for word in words):
+            return doc_type
+    return DEFAULT_DOCUMENT_TYPE
+
+
+def match_organization(hits):
+    for name, keyword in _ORGANIZATIONS_FOLDED:
+        if keyword in hits:
+            return name
+    return None
+
+
+def find_title(text, hits, max_lines=5):
+    """
+    Première des `max_lines` premières lignes non vides qui ressemble à un
+    titre : plus de 10 caractères et aucun mot-clé d'exclusion (date, n°...).
+    `hits` : résultat de keyword_hits(text), positions dans `text`.
+    """
+    excluded = hits.starts(_TITLE_EXCLUDED_FOLDED)
+    seen = 0
+    for match in _LINE_RE.finditer(text):
+        line = match.group().strip()
+        if not line:
+            continue
+        # une exclusion commence-t-elle dans cette ligne ?
+        i = bisect.bisect_left(excluded, match.start())
+        if len(line) > 10 and not (i < len(excluded) and excluded[i] < match.end()):
+            return line
+        seen += 1
+        if seen == max_lines:
+            break
+    return None
+
+
+def first_group(regexes, text):
+    """Groupe 1 du premier motif qui correspond (ordre de priorité)"""
+    for regex in regexes:
+        match = regex.search(text)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _two_digit_year(year):
+    # même convention que dateparser / strptime('%y')
+    return year + (2000 if year < 69 else 1900)
+
+
+def parse_date_fast(raw):
+    """
+    Normalisation sans dateparser des formats les plus fréquents :
+    m/j/aa(aa) (ordre utilisé par dateparser), aaaa-mm-jj et « 12 mars 2019 ».
+    Retourne None si le format n'est pas couvert ou la date invalide :
+    l'appelant se rabat alors sur dateparser.
+    """
+    raw = raw.strip()
+    try:
+        match = _NUMERIC_DATE_RE.fullmatch(raw)
+        if match:
+            month, day, year = int(match.group(1)), int(match.group(3)), match.group(4)
+            year = _two_digit_year(int(year)) if len(year) == 2 else int(year)
+            return datetime(year, month, day)
+
+        match = _ISO_DATE_RE.fullmatch(raw)
+        if match:
+            return datetime(int(match.group(1)), int(match.group(3)), int(match.group(4)))
+
+        match = _MONTH_DATE_RE.fullmatch(raw)
+        if match:
+            month = MONTHS.get(match.group(2).lower())
+            if month:
+                return datetime(int(match.group(3)), month, int(match.group(1)))
+    except ValueError:
+        return None
+    return None
@@ -0,0 +1,361 @@
+# templates.py
+# Chemin rapide pour les formulaires récurrents : une empreinte de la page
+# (hash perceptuel + densité d'encre par case) reconnaît un modèle enregistré
+# en quelques millisecondes ; seules les zones des champs déclarés passent
+# alors dans Tesseract, puis un parseur par champ. Les documents inconnus
+# suivent le chemin complet (OCR de la page + règles).
+#
+#   python templates.py register exemple.png --name avis_revue \
+#          --document-type scientific_review_form --fields champs.json
+#   python templates.py match document.png
+#   python templates.py list
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import metrics
+import regions
+import ocr_backends
+import date_normalizer
+from image_io import load_gray
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+TEMPLATES_PATH = os.environ.get("ADMINDOC_TEMPLATES", "templates.json")
+TEMPLATES_ENABLED = os.environ.get("ADMINDOC_TEMPLATES_ENABLED", "1") == "1"
+# Part maximale de bits différents entre l'empreinte de la page et celle du modèle
+TEMPLATE_MAX_DISTANCE = float(os.environ.get("ADMINDOC_TEMPLATE_MAX_DISTANCE", 0.12))
+# Écart relatif maximal du rapport largeur/hauteur
+TEMPLATE_ASPECT_TOLERANCE = 0.05
+
+HASH_SIZE = 8     # pHash : 8x8 basses fréquences de la DCT (structure globale)
+LAYOUT_GRID = 16  # cases 16x16 : position des blocs de texte et des cadres
+LAYOUT_INK = 0.02  # part d'encre à partir de laquelle une case est « occupée »
+ZONE_PADDING = 8  # pixels ajoutés autour de chaque zone (boîtes enregistrées un peu justes)
+
+
+# ============================================================
+# EMPREINTE
+# ============================================================
+
+def fingerprint(gray):
+    """Empreinte binaire (HASH_SIZE² + LAYOUT_GRID² bits) d'une page en niveaux de gris"""
+    # une seule réduction de la page entière, tout le reste sur 128x128 ;
+    # encre relative au fond du papier (scans grisés ou jaunis)
+    side = LAYOUT_GRID * 8
+    small = cv2.resize(gray, (side, side), interpolation=cv2.INTER_AREA).astype(np.float32)
+    background = max(float(np.percentile(small, 90)), 1.0)
+    ink = np.clip(1.0 - small / background, 0.0, 1.0)
+
+    # hash perceptuel : insensible au bruit et aux petits écarts de contraste
+    dct = cv2.dct(cv2.resize(ink, (32, 32), interpolation=cv2.INTER_AREA))
+    low = dct[:HASH_SIZE, :HASH_SIZE].ravel()
+    phash = low > np.median(low[1:])
+
+    # occupation des cases
+    layout = cv2.resize(ink, (LAYOUT_GRID, LAYOUT_GRID), interpolation=cv2.INTER_AREA) > LAYOUT_INK
+    return np.concatenate([phash, layout.ravel()])
+
+
+def fingerprint_hex(bits):
+    return np.packbits(bits).tobytes().hex()
+
+
+def bits_from_hex(value):
+    return np.unpackbits(np.frombuffer(bytes.fromhex(value), np.uint8))[:HASH_SIZE ** 2 + LAYOUT_GRID ** 2]
+
+
+# ============================================================
+# PARSEURS DE CHAMPS
+# ============================================================
+
+def _clean(text):
+    return " ".join(text.split())
+
+
+def parse_date(text):
+    candidates = date_normalizer.find_date_candidates(text)
+    for _, parsed in date_normalizer.deduplicate_spans(candidates, date_normalizer.normalize_date):
+        return parsed.strftime("%Y-%m-%d")
+    parsed = date_normalizer.normalize_date(_clean(text)) if text.strip() else None
+    return parsed.strftime("%Y-%m-%d") if parsed else None
+
+
+def parse_token(text):
+    """Premier mot après un éventuel libellé (« N° : », « Ref. »)"""
+    text = re.sub(r"^[^:]*:\s*", "", _clean(text))
+    return text.split()[0] if text else None
+
+
+def parse_number(text):
+    match = re.search(r"\d[\d\s.,]*", text)
+    return re.sub(r"\s", "", match.group(0)).rstrip(".,") if match else None
+
+
+FIELD_PARSERS = {
+    "text": lambda text: _clean(text) or None,
+    "lines": lambda text: [line.strip() for line in text.splitlines() if line.strip()] or None,
+    "token": parse_token,
+    "number": parse_number,
+    "date": parse_date,
+}
+
+
+def extract_scientific_fields(text):
+    """Extraction spécifique pour les formulaires scientifiques"""
+    fields = {
+        "registration_number": None,
+        "date": None,
+        "authors": None,
+        "title": None,
+        "recommendation": None,
+        "suggested_revision": None
+    }
+
+    # Registration Number
+    reg_match = re.search(r'Registration No\.\s*(\S+)', text, re.IGNORECASE)
+    if reg_match:
+        fields["registration_number"] = reg_match.group(1)
+
+    # Date
+    date_match = re.search(r'Date\s+([A-Za-z]+\s+\d{1,2},\s+\d{4})', text, re.IGNORECASE)
+    if date_match:
+        fields["date"] = date_match.group(1)
+
+    # Authors
+    authors_match = re.search(r'AUTHORS?:\s*(.+?)(?=\nTITLE|\nREVIEW|\n\n)', text, re.IGNORECASE | re.DOTALL)
+    if authors_match:
+        fields["authors"] = authors_match.group(1).strip()
+
+    # Title
+    title_match = re.search(r'TITLE\s*["\']?(.+?)["\']?(?=\nREVIEW|\n\n)', text, re.IGNORECASE | re.DOTALL)
+    if title_match:
+        fields["title"] = title_match.group(1).strip()
+
+    # Recommendation
+    rec_match = re.search(r'RECOMMENDATION[:_]\s*(.+?)(?=\n|$)', text, re.IGNORECASE)
+    if rec_match:
+        fields["recommendation"] = rec_match.group(1).strip()
+
+    # Suggested Revision
+    rev_match = re.search(r'SUGGESTED REVISIONS?[:_]\s*(.+?)(?=\n\n|$)', text, re.IGNORECASE | re.DOTALL)
+    if rev_match:
+        fields["suggested_revision"] = rev_match.group(1).strip()
+
+    return fields
+
+
+# Parseurs appliqués au texte de toutes les zones, pour les champs restés vides
+DOCUMENT_PARSERS = {
+    "scientific_review": extract_scientific_fields,
+}
+
+
+# ============================================================
+# REGISTRE
+# ============================================================
+
+class TemplateRegistry:
+    """
+    Modèles de formulaires chargés depuis un fichier JSON :
+    {"templates": [{"name", "document_type", "fingerprint", "aspect",
+                    "fields": [{"name", "box": [x1, y1, x2, y2] (0-1000),
+                                "parser", "psm", "required"}],
+                    "document_parser", "profile" (prétraitement des zones, optionnel)}]}
+    """
+
+    def __init__(self, path=TEMPLATES_PATH):
+        self.path = path
+        self.templates = []
+        self._bits = np.zeros((0, HASH_SIZE ** 2 + LAYOUT_GRID ** 2), dtype=bool)
+        self._aspects = np.zeros(0)
+        self.version = None
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            self.templates = json.loads(raw)["templates"]
+            self.version = hashlib.sha256(raw).hexdigest()[:12]
+        else:
+            self.templates, self.version = [], None
+
+        for template in self.templates:
+            for field in template["fields"]:
+                if field.get("parser", "text") not in FIELD_PARSERS:
+                    raise ValueError(f"Parseur inconnu pour {template['name']}.{field['name']}: "
+                                     f"{field['parser']} (attendu: {', '.join(FIELD_PARSERS)})")
+        if self.templates:
+            self._bits = np.stack([bits_from_hex(t["fingerprint"]).astype(bool)
+                                   for t in self.templates])
+            self._aspects = np.array([t["aspect"] for t in self.templates])
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"templates": self.templates}, f, indent=2, ensure_ascii=False)
+        self.load()
+
+    def register(self, name, gray, fields, document_type, document_parser=None):
+        """Enregistrer (ou remplacer) un modèle à partir d'une page exemple
+        décodée (niveaux de gris, sans prétraitement, comme dans match_page)"""
+        if document_parser is not None and document_parser not in DOCUMENT_PARSERS:
+            raise ValueError(f"Parseur de document inconnu: {document_parser}")
+        template = {
+            "name": name,
+            "document_type": document_type,
+            "fingerprint": fingerprint_hex(fingerprint(gray)),
+            "aspect": round(gray.shape[1] / gray.shape[0], 4),
+            "fields": fields,
+            "document_parser": document_parser,
+        }
+        self.templates = [t for t in self.templates if t["name"] != name] + [template]
+        self.save()
+        return template
+
+    def match(self, gray):
+        """(modèle, distance) du modèle le plus proche sous le seuil, sinon (None, distance)"""
+        if not self.templates:
+            return None, None
+
+        distances = (self._bits != fingerprint(gray)).mean(axis=1)
+        aspect = gray.shape[1] / gray.shape[0]
+        distances[np.abs(self._aspects - aspect) / self._aspects > TEMPLATE_ASPECT_TOLERANCE] = 1.0
+
+        best = int(distances.argmin())
+        distance = float(distances[best])
+        if distance <= TEMPLATE_MAX_DISTANCE:
+            return self.templates[best], distance
+        return None, distance
+
+
+# ============================================================
+# OCR PAR ZONES
+# ============================================================
+
+def match_page(gray):
+    """
+    Modèle reconnu pour une page décodée (niveaux de gris, sans
+    prétraitement) : même entrée pour le pipeline, la CLI et register.
+    """
+    with metrics.stage("fingerprint"):
+        return get_registry().match(gray)
+
+
+def crop_zone(gray, box, padding=ZONE_PADDING):
+    """Zone 0-1000 -> (pixels de la page, x, y de l'origine)"""
+    height, width = gray.shape[:2]
+    x1, y1, x2, y2 = box
+    left = max(0, int(x1 * width / 1000) - padding)
+    top = max(0, int(y1 * height / 1000) - padding)
+    right = min(width, int(x2 * width / 1000) + padding)
+    bottom = min(height, int(y2 * height / 1000) + padding)
+    return gray[top:bottom, left:right], left, top
+
+
+def extract_fields(template, gray, lang):
+    """
+    OCR des seules zones du modèle, puis parseur de chaque champ.
+    Retourne (champs, texte des zones, données image_to_data des zones en
+    coordonnées page), ou None si un champ obligatoire reste vide (page mal
+    alignée, modèle trompeur) : chemin complet.
+    """
+    backend = ocr_backends.get_backend()
+    fields, texts, zones = {}, [], []
+
+    with metrics.stage("ocr_zones"):
+        for field in template["fields"]:
+            crop, left, top = crop_zone(gray, field["box"])
+            if crop.size == 0:
+                text = ""
+            else:
+                # image_to_data plutôt que image_to_string : même coût, et
+                # les mots gardent leurs boîtes (layout pour le NER)
+                config = f"--oem 3 --psm {field.get('psm', 6)}"
+                data = backend.image_to_data(Image.fromarray(crop), lang, config)
+                text = ocr_backends.text_from_ocr_data(data)
+                zones.append((data, left, top))
+            texts.append(text.strip())
+            fields[field["name"]] = FIELD_PARSERS[field.get("parser", "text")](text)
+
+    text = "\n\n".join(texts)
+    parser = template.get("document_parser")
+    if parser:
+        for key, value in DOCUMENT_PARSERS[parser](text).items():
+            if fields.get(key) is None:
+                fields[key] = value
+
+    if any(field.get("required") and fields.get(field["name"]) is None
+           for field in template["fields"]):
+        return None
+    return fields, text, regions.merge_region_data(zones, (gray.shape[1], gray.shape[0]))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registre du processus, chargé au premier appel"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TemplateRegistry()
+        return _registry
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Modèles de formulaires (empreinte + OCR par zones)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    register = sub.add_parser("register", help="enregistrer un modèle depuis une page exemple")
+    register.add_argument("image")
+    register.add_argument("--name", required=True)
+    register.add_argument("--document-type", required=True)
+    register.add_argument("--fields", required=True,
+                          help='JSON : [{"name", "box": [x1, y1, x2, y2] (0-1000), "parser", "psm", "required"}]')
+    register.add_argument("--document-parser", choices=sorted(DOCUMENT_PARSERS))
+
+    match_cmd = sub.add_parser("match", help="modèle reconnu pour une page")
+    match_cmd.add_argument("image")
+
+    sub.add_parser("list", help="modèles enregistrés")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    if args.command == "register":
+        with open(args.fields, "r", encoding="utf-8") as f:
+            fields = json.load(f)
+        template = registry.register(args.name, load_gray(args.image), fields,
+                                     args.document_type, args.document_parser)
+        print(f"Modèle {template['name']} enregistré dans {registry.path} "
+              f"({len(fields)} champs, empreinte {template['fingerprint'][:16]}...)")
+    elif args.command == "match":
+        template, distance = match_page(load_gray(args.image))
+        if template is None:
+            print(f"Aucun modèle (distance minimale: {distance})")
+            return 1
+        print(f"{template['name']} ({template['document_type']}), distance {distance:.3f}")
+    else:
+        for template in registry.templates:
+            print(f"{template['name']:<30} {template['document_type']:<32} "
+                  f"{len(template['fields'])} champs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,15 @@
+import os
 import json
-from datasets import Dataset
+import time
+import shutil
+import hashlib
+import inspect
+import argparse
+from functools import partial
+
+import numpy as np
+
+from datasets import Dataset, Features, Sequence, Value, Array3D, load_from_disk
 from PIL import Image
 import torch
 
@@ -9,95 +19,335 @@ from transformers import (
     LayoutLMv3ImageProcessor,
     LayoutLMv3ForTokenClassification,
     TrainingArguments,
-    Trainer
+    Trainer,
+    TrainerCallback
 )
 
 # ------------------------
-# LOAD DATASET
+# CONFIG
 # ------------------------
-data = []
-with open("train_data.jsonl", "r", encoding="utf-8") as f:
-    for line in f:
-        data.append(json.loads(line))
+TRAIN_JSONL = "train_data.jsonl"
+BASE_MODEL = "microsoft/layoutlmv3-base"
+OUTPUT_DIR = "models/layoutlmv3_trained"
+
+# Encodage pré-calculé (Arrow, mappé en mémoire), un dossier par empreinte
+ENCODE_CACHE_DIR = os.environ.get("ADMINDOC_ENCODE_CACHE", "cache/encoded")
+# À incrémenter si encode_example change de sortie
+ENCODE_VERSION = "2"
+MAX_LENGTH = 512
+
+# Documents de fin de JSONL réservés à l'évaluation (même convention que
+# benchmarks/backends.py)
+EVAL_SIZE = 20
+
+ENCODED_FEATURES = Features({
+    "input_ids": Sequence(Value("int32")),
+    "attention_mask": Sequence(Value("int8")),
+    "bbox": Sequence(Sequence(Value("int16"), length=4)),
+    "labels": Sequence(Value("int16")),
+    "pixel_values": Array3D(shape=(3, 224, 224), dtype="float32"),
+    # longueur de la séquence, pour regrouper les lots par taille
+    "length": Value("int32"),
+})
 
-dataset = Dataset.from_list(data)
 
 # ------------------------
-# BUILD LABEL LIST FROM DATA
+# LOAD DATASET
 # ------------------------
-all_labels = set()
-for item in data:
-    all_labels.update(item["ner_tags"])
+def load_records(path=TRAIN_JSONL):
+    """JSONL -> Dataset Arrow (pas de liste Python de tous les documents)"""
+    return Dataset.from_json(path)
 
-LABEL_LIST = sorted(list(all_labels))
-label2id = {l: i for i, l in enumerate(LABEL_LIST)}
-id2label = {i: l for l, i in label2id.items()}
 
-print("Detected labels:", LABEL_LIST)
+def build_label_list(dataset):
+    all_labels = set()
+    for tags in dataset["ner_tags"]:
+        all_labels.update(tags)
+    return sorted(all_labels)
+
 
 # ------------------------
 # PROCESSOR (NO OCR)
 # ------------------------
-tokenizer = LayoutLMv3TokenizerFast.from_pretrained("microsoft/layoutlmv3-base")
+def build_processor(base_model=BASE_MODEL):
+    tokenizer = LayoutLMv3TokenizerFast.from_pretrained(base_model)
+    return LayoutLMv3Processor(
+        image_processor=LayoutLMv3ImageProcessor(apply_ocr=False),
+        tokenizer=tokenizer
+    )
 
-processor = LayoutLMv3Processor(
-    image_processor=LayoutLMv3ImageProcessor(apply_ocr=False),
-    tokenizer=tokenizer
-)
 
 # ------------------------
 # ENCODING FUNCTION
 # ------------------------
-def encode_batch(batch):
-    image = Image.open(batch["image_path"]).convert("RGB")
+def encode_example(example, processor, label2id):
+    image = Image.open(example["image_path"].replace("\\", "/")).convert("RGB")
 
+    # pas de padding ici : les séquences sont complétées par lot à l'entraînement
     encoding = processor(
         images=image,
-        text=batch["words"],          # <--- OBLIGATOIRE
-        boxes=batch["boxes"],
-        word_labels=[label2id[tag] for tag in batch["ner_tags"]],
+        text=example["words"],          # <--- OBLIGATOIRE
+        boxes=example["boxes"],
+        word_labels=[label2id[tag] for tag in example["ner_tags"]],
         truncation=True,
-        padding="max_length",
-        return_tensors="pt"
+        max_length=MAX_LENGTH,
+        return_tensors="np"
     )
 
     # squeeze batch dimension
-    return {k: v.squeeze(0) for k, v in encoding.items()}
- 
+    encoded = {k: v[0] for k, v in encoding.items()}
+    encoded["length"] = len(encoded["input_ids"])
+    return encoded
+
+
+def encode_fingerprint(data_path, dataset, processor, labels):
+    """
+    Empreinte des entrées de l'encodage : contenu du JSONL, mtime/taille de
+    chaque image, configuration du processor et liste des labels.
+    """
+    digest = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+    for image_path in dataset["image_path"]:
+        path = image_path.replace("\\", "/")
+        stat = os.stat(path) if os.path.exists(path) else None
+        digest.update(f"{path}:{stat and stat.st_mtime_ns}:{stat and stat.st_size}\n".encode())
+
+    digest.update(json.dumps({
+        "version": ENCODE_VERSION,
+        "max_length": MAX_LENGTH,
+        "labels": labels,
+        "tokenizer": processor.tokenizer.name_or_path,
+        "vocab_size": len(processor.tokenizer),
+        "image_processor": processor.image_processor.to_dict(),
+    }, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+def load_encoded(data_path, processor, num_proc=None, rebuild=False):
+    """
+    Dataset encodé, chargé sans copie depuis le cache (mappé en mémoire).
+    Construit en parallèle et écrit sur disque si l'empreinte est nouvelle.
+    Retourne (dataset, labels).
+    """
+    dataset = load_records(data_path)
+    labels = build_label_list(dataset)
+    fingerprint = encode_fingerprint(data_path, dataset, processor, labels)
+    cache_path = os.path.join(ENCODE_CACHE_DIR, fingerprint)
+
+    if os.path.isdir(cache_path) and not rebuild:
+        print(f"Encodage en cache → {cache_path}")
+        encoded = load_from_disk(cache_path)
+    else:
+        label2id = {l: i for i, l in enumerate(labels)}
+        encoded = dataset.map(
+            encode_example,
+            fn_kwargs={"processor": processor, "label2id": label2id},
+            remove_columns=dataset.column_names,
+            features=ENCODED_FEATURES,
+            num_proc=num_proc,
+            desc="Encodage LayoutLMv3",
+        )
+        tmp_path = cache_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        encoded.save_to_disk(tmp_path)
+        shutil.rmtree(cache_path, ignore_errors=True)
+        os.replace(tmp_path, cache_path)
+        print(f"Encodage écrit → {cache_path}")
+        encoded = load_from_disk(cache_path)
+
+    return encoded.with_format("torch"), labels
 
-dataset = dataset.map(encode_batch)
 
 # ------------------------
-# MODEL
+# BATCHING
 # ------------------------
-model = LayoutLMv3ForTokenClassification.from_pretrained(
-    "microsoft/layoutlmv3-base",
-    num_labels=len(LABEL_LIST),
-    id2label=id2label,
-    label2id=label2id
-)
+def collate(features, pad_token_id=1, pad_to_multiple_of=None):
+    """Compléter chaque lot à la séquence la plus longue du lot"""
+    length = max(len(f["input_ids"]) for f in features)
+    if pad_to_multiple_of:
+        length = min(MAX_LENGTH, -(-length // pad_to_multiple_of) * pad_to_multiple_of)
+    batch = {
+        "input_ids": torch.full((len(features), length), pad_token_id, dtype=torch.long),
+        "attention_mask": torch.zeros((len(features), length), dtype=torch.long),
+        "bbox": torch.zeros((len(features), length, 4), dtype=torch.long),
+        "labels": torch.full((len(features), length), -100, dtype=torch.long),
+    }
+    for i, f in enumerate(features):
+        n = len(f["input_ids"])
+        for key in ("input_ids", "attention_mask", "bbox", "labels"):
+            batch[key][i, :n] = f[key]
+    batch["pixel_values"] = torch.stack([f["pixel_values"] for f in features])
+    return batch
+
+
+def split_holdout(dataset, eval_size=EVAL_SIZE):
+    """(entraînement, évaluation) : les `eval_size` derniers documents pour l'évaluation"""
+    eval_size = min(eval_size, len(dataset) - 1)
+    if eval_size <= 0:
+        return dataset, None
+    cut = len(dataset) - eval_size
+    return dataset.select(range(cut)), dataset.select(range(cut, len(dataset)))
+
 
 # ------------------------
-# TRAINING ARGS
+# EVALUATION
 # ------------------------
-training_args = TrainingArguments(
-    output_dir="models/layoutlmv3_trained",
-    per_device_train_batch_size=1,
-    num_train_epochs=3,
-    logging_steps=20,
-    save_strategy="epoch",
-)
+def build_compute_metrics(id2label):
+    """F1 seqeval au niveau entité, sur le premier sous-mot de chaque mot"""
+    from seqeval.metrics import f1_score, precision_score, recall_score
 
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=dataset,
-)
+    def compute_metrics(eval_pred):
+        logits, label_ids = eval_pred
+        predictions = np.argmax(logits, axis=-1)
+
+        true_tags, pred_tags = [], []
+        for pred_row, label_row in zip(predictions, label_ids):
+            keep = label_row != -100
+            true_tags.append([id2label[int(i)] for i in label_row[keep]])
+            pred_tags.append([id2label[int(i)] for i in pred_row[keep]])
+
+        return {
+            "precision": precision_score(true_tags, pred_tags, zero_division=0),
+            "recall": recall_score(true_tags, pred_tags, zero_division=0),
+            "f1": f1_score(true_tags, pred_tags, zero_division=0),
+        }
+
+    return compute_metrics
+
+
+class ThroughputCallback(TrainerCallback):
+    """Ajoute samples/sec (documents d'entraînement traités) à chaque log"""
+
+    def __init__(self, samples_per_step):
+        self.samples_per_step = samples_per_step
+        self._last = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._last = (time.perf_counter(), state.global_step)
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs is None or self._last is None or "loss" not in logs:
+            return
+        now = time.perf_counter()
+        last_time, last_step = self._last
+        if now > last_time and state.global_step > last_step:
+            logs["samples_per_sec"] = round(
+                (state.global_step - last_step) * self.samples_per_step / (now - last_time), 2)
+        self._last = (now, state.global_step)
+
+
+def precision_flags(precision):
+    """bf16 si le GPU le supporte, sinon fp16 sur GPU, fp32 sur CPU"""
+    if precision == "auto":
+        if torch.cuda.is_available():
+            precision = "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+        else:
+            precision = "fp32"
+    return {"bf16": precision == "bf16", "fp16": precision == "fp16"}
+
+
+# ------------------------
+# TRAINING
+# ------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Entraînement LayoutLMv3 (NER)")
+    parser.add_argument("--data", default=TRAIN_JSONL)
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count() or 1,
+                        help="processus pour l'encodage")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="ré-encoder même si l'empreinte est en cache")
+    parser.add_argument("--encode-only", action="store_true",
+                        help="construire le cache d'encodage sans entraîner")
+    parser.add_argument("--epochs", type=float, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--grad-accum", type=int, default=1,
+                        help="pas d'accumulation de gradient (lot effectif = batch-size x grad-accum)")
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--precision", choices=("auto", "fp32", "bf16", "fp16"), default="auto")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="processus du DataLoader")
+    parser.add_argument("--eval-size", type=int, default=EVAL_SIZE,
+                        help="derniers documents réservés à l'évaluation (0 = aucune)")
+    parser.add_argument("--no-group-by-length", action="store_true",
+                        help="lots aléatoires au lieu de lots de longueurs voisines")
+    args = parser.parse_args()
+
+    processor = build_processor()
+    dataset, labels = load_encoded(args.data, processor, num_proc=args.num_proc,
+                                   rebuild=args.rebuild_cache)
+    label2id = {l: i for i, l in enumerate(labels)}
+    id2label = {i: l for l, i in label2id.items()}
+
+    print("Detected labels:", labels)
+    if args.encode_only:
+        return
+
+    train_dataset, eval_dataset = split_holdout(dataset, args.eval_size)
+    print(f"Train: {len(train_dataset)} | Eval: {len(eval_dataset) if eval_dataset else 0}")
+
+    # ------------------------
+    # MODEL
+    # ------------------------
+    model = LayoutLMv3ForTokenClassification.from_pretrained(
+        BASE_MODEL,
+        num_labels=len(labels),
+        id2label=id2label,
+        label2id=label2id
+    )
+
+    # ------------------------
+    # TRAINING ARGS
+    # ------------------------
+    # "evaluation_strategy" renommé "eval_strategy" dans les versions récentes
+    eval_key = ("eval_strategy" if "eval_strategy" in inspect.signature(TrainingArguments).parameters
+                else "evaluation_strategy")
+
+    training_args = TrainingArguments(
+        output_dir=args.output,
+        num_train_epochs=args.epochs,
+        learning_rate=args.lr,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
+        gradient_accumulation_steps=args.grad_accum,
+        group_by_length=not args.no_group_by_length,
+        length_column_name="length",
+        dataloader_num_workers=args.workers,
+        dataloader_pin_memory=torch.cuda.is_available(),
+        logging_steps=20,
+        save_strategy="epoch",
+        **{eval_key: "epoch" if eval_dataset is not None else "no"},
+        **precision_flags(args.precision),
+        # colonnes déjà au format du modèle
+        remove_unused_columns=False,
+    )
+
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=eval_dataset,
+        data_collator=partial(collate, pad_token_id=processor.tokenizer.pad_token_id,
+                              pad_to_multiple_of=8),
+        compute_metrics=build_compute_metrics(id2label) if eval_dataset is not None else None,
+        callbacks=[ThroughputCallback(args.batch_size * args.grad_accum
+                                      * max(1, training_args.world_size))],
+    )
+
+    train_metrics = trainer.train().metrics
+    print("Train:", {k: train_metrics[k] for k in ("train_runtime", "train_samples_per_second")
+                     if k in train_metrics})
+    if eval_dataset is not None:
+        print("Eval:", trainer.evaluate())
 
-trainer.train()
-model.save_pretrained("models/layoutlmv3_trained")
-processor.save_pretrained("models/layoutlmv3_trained")
+    model.save_pretrained(args.output)
+    processor.save_pretrained(args.output)
 
-print("🎉 TRAINING COMPLETE!")
+    print("🎉 TRAINING COMPLETE!")
 
 
+if __name__ == "__main__":
+    main()